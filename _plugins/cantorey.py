@@ -1,14 +1,18 @@
 """Pages for the Cantorey Performance Materials project."""
 
+from functools import partial
 from operator import itemgetter
 import os
 import tempfile
+from typing import Optional
 
-import git
 from github.Organization import Organization
 import strictyaml  # type: ignore
 
 from common_functions import (format_metadata, make_part_name)
+from fragment_cache import FragmentCache, get_fragment
+from git_source import GIT_TIMEOUT, clone_tag
+from scheduler import RequestScheduler
 
 
 PAGE_TEMPLATE = """\
@@ -39,10 +43,11 @@ WORK_TEMPLATE = """\
   {asset_links}
 """
 
-PDF_LINK_TEMPLATE = ("[{part_name}](https://edition.esser-skala.at/assets/"
-                     "pdf/cantorey-performance-materials/"
-                     "{composer}/{work}/{file})"
-                     "{{: .asset-link}}")
+PDF_URL_TEMPLATE = ("https://edition.esser-skala.at/assets/"
+                    "pdf/cantorey-performance-materials/"
+                    "{composer}/{work}/{file}")
+
+PDF_LINK_TEMPLATE = "[{part_name}]({url}){{: .asset-link}}"
 
 
 def format_composer(c: dict) -> str:
@@ -50,25 +55,66 @@ def format_composer(c: dict) -> str:
     return c["last"] + ", " + c["first"] + " " + c["suffix"]
 
 
-def add_cantorey(gh_org: Organization) -> None:
+def format_work(record: dict) -> list[str]:
+    """Formats a work.
+
+    Args:
+        record (dict): composer and work directory, content of the
+          metadata file, score files and name of the GitHub organization
+
+    Returns:
+        list[str]: title, composer and formatted entry of the work
+    """
+    metadata = strictyaml.load(record["metadata"]).data
+    metadata = format_metadata(metadata, record["org"])
+    if len(metadata["subtitle"]) > 1:
+        metadata["subtitle"] = "<br/>" + metadata["subtitle"]
+
+    metadata["asset_links"] = " ".join([
+        PDF_LINK_TEMPLATE.format(
+            part_name=make_part_name(score, ".ly"),
+            url=PDF_URL_TEMPLATE.format(composer=record["composer_dir"],
+                                        work=record["work_dir"],
+                                        file=score.replace(".ly", ".pdf"))
+        )
+        for score in record["scores"]
+    ])
+
+    return [metadata["title"],
+            format_composer(metadata["composer"]),
+            WORK_TEMPLATE.format(**metadata)]
+
+
+def add_cantorey(gh_org: Organization,
+                 scheduler: RequestScheduler,
+                 cache: Optional[FragmentCache] = None) -> list[str]:
     """Generates a markdown page for the project.
 
     Args:
         gh_org (Organization): GitHub organization that contains the repo
+        scheduler (RequestScheduler): scheduler for GitHub requests
+        cache (Optional[FragmentCache]): cache for the formatted works
+
+    Returns:
+        list[str]: URLs of all linked PDFs
     """
     print("Generating page for cantorey-performance-materials")
 
-    last_tag = (gh_org
-                .get_repo("cantorey-performance-materials")
-                .get_tags()[0]
-                .name)
+    last_tag = scheduler.call("latest_tag",
+                              lambda: gh_org
+                              .get_repo("cantorey-performance-materials")
+                              .get_tags()[0]
+                              .name)
 
     with tempfile.TemporaryDirectory() as repo_dir:
-        git.Repo.clone_from(
-            "https://github.com/edition-esser-skala/" +
+        scheduler.resilience.call(
+            "git_clone",
+            clone_tag,
+            "https://github.com/edition-esser-skala/"
             "cantorey-performance-materials",
+            last_tag,
             repo_dir,
-            multi_options=["--depth 1", f"--branch {last_tag}"]
+            deadline=GIT_TIMEOUT + 10
         )
 
         try:
@@ -79,6 +125,7 @@ def add_cantorey(gh_org: Organization) -> None:
             ignored_works = []
 
         composers = []
+        urls = []
         for composer_dir in sorted(os.listdir(f"{repo_dir}/works")):
             works = []
             for work_dir in os.listdir(f"{repo_dir}/works/{composer_dir}"):
@@ -88,33 +135,35 @@ def add_cantorey(gh_org: Organization) -> None:
                 work_dir_root = f"{repo_dir}/works/{composer_dir}/{work_dir}/"
                 with open(work_dir_root + "metadata.yaml",
                           encoding="utf-8") as f:
-                    metadata = strictyaml.load(f.read()).data
-
-                metadata = format_metadata(metadata, gh_org.login)
-                if len(metadata["subtitle"]) > 1:
-                    metadata["subtitle"] = "<br/>" + metadata["subtitle"]
-
-                assets = []
-                for score in os.listdir(work_dir_root + "scores"):
-                    assets.append(
-                        PDF_LINK_TEMPLATE.format(
-                            part_name=make_part_name(score, ".ly"),
-                            composer=composer_dir,
-                            work=work_dir,
-                            file=score.replace(".ly", ".pdf")
-                        )
-                    )
-                metadata["asset_links"] = " ".join(assets)
-
-                works.append(metadata)
+                    metadata = f.read()
+                record = {
+                    "composer_dir": composer_dir,
+                    "work_dir": work_dir,
+                    "metadata": metadata,
+                    "scores": sorted(os.listdir(work_dir_root + "scores")),
+                    "org": gh_org.login
+                }
+
+                urls += [
+                    PDF_URL_TEMPLATE.format(composer=composer_dir,
+                                            work=work_dir,
+                                            file=score.replace(".ly", ".pdf"))
+                    for score in record["scores"]
+                ]
+                works.append(
+                    get_fragment(cache,
+                                 "cantorey_work",
+                                 record,
+                                 partial(format_work, record))
+                )
 
             if not works:
                 continue
-            works.sort(key=itemgetter("title"))
+            works.sort(key=itemgetter(0))
             composers.append(
                 COMPOSER_TEMPLATE.format(
-                    composer_long=format_composer(works[0]["composer"]),
-                    works="\n".join([WORK_TEMPLATE.format(**w) for w in works])
+                    composer_long=works[0][1],
+                    works="\n".join([entry for _, _, entry in works])
                 )
             )
 
@@ -127,3 +176,5 @@ def add_cantorey(gh_org: Organization) -> None:
                 composers="\n\n".join(composers)
             )
         )
+
+    return urls
@@ -0,0 +1,120 @@
+"""Machine-readable catalogue of all works, sharded per composer."""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+CATALOGUE_URL = "/assets/catalogue"
+
+OPTIONAL_FIELDS = ["festival", "imslp", "asin", "work_dir"]
+
+
+def make_catalogue_record(work: dict) -> dict:
+    """Extracts the structured fields of a work for the catalogue.
+
+    Args:
+        work (dict): work metadata
+
+    Returns:
+        dict: catalogue record
+    """
+    record = {
+        "id": work["id"],
+        "id_slug": work["id_slug"],
+        "title": work["title"],
+        "genre": work["genre"],
+        "scoring": work["scoring"],
+        "license": work["license_id"],
+        "repo": work["repo"],
+        "releases": work["releases"],
+        "assets": [{"file": file, "url": url}
+                   for file, url in sorted(work["asset_urls"].items())]
+    }
+    for field in OPTIONAL_FIELDS:
+        if field in work:
+            record[field] = work[field]
+    return record
+
+
+def serialize(data: dict) -> bytes:
+    """Serializes catalogue data deterministically.
+
+    Args:
+        data (dict): catalogue data
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    return json.dumps(data,
+                      ensure_ascii=False,
+                      sort_keys=True,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def write_catalogue(table: pd.DataFrame, out_dir: str) -> None:
+    """Writes one JSON shard per composer and an index of all shards.
+
+    The index lists the SHA-256 hash and the last release date of each
+    shard, so that consumers only need to fetch shards that changed.
+    Shards of a previous index whose composer has no works any more are
+    removed.
+
+    Args:
+        table (pd.DataFrame): works table
+        out_dir (str): output directory
+    """
+    print("Generating catalogue")
+    os.makedirs(out_dir, exist_ok=True)
+
+    shards = []
+    for slug, composer_works in table.groupby("composer_slug", sort=False):
+        first_row = composer_works.iloc[0]
+        title = first_row["composer_title"]
+        composer = {"first": first_row["composer_first"],
+                    "last": first_row["composer_last"],
+                    "suffix": first_row["composer_suffix"]}
+        records = sorted(
+            [make_catalogue_record(w) for w in composer_works["record"]],
+            key=lambda r: (r["title"], r["id_slug"])
+        )
+
+        shard = serialize({"composer": composer,
+                           "title": title,
+                           "works": records})
+        with open(f"{out_dir}/{slug}.json", "wb") as f:
+            f.write(shard)
+
+        shards.append({
+            "slug": slug,
+            "title": title,
+            "url": f"{CATALOGUE_URL}/{slug}.json",
+            "sha256": hashlib.sha256(shard).hexdigest(),
+            "works": len(records),
+            "last_release": max(r["releases"][0]["date"] for r in records)
+        })
+
+    shards.sort(key=lambda s: s["slug"])
+    remove_stale_shards(out_dir, {s["slug"] for s in shards})
+    with open(f"{out_dir}/index.json", "wb") as f:
+        f.write(serialize({"version": 1, "shards": shards}))
+
+
+def remove_stale_shards(out_dir: str, slugs: set[str]) -> None:
+    """Removes the shards of the previous index that are no longer needed.
+
+    Args:
+        out_dir (str): output directory
+        slugs (set[str]): slugs of the current shards
+    """
+    index_file = f"{out_dir}/index.json"
+    if not os.path.exists(index_file):
+        return
+
+    with open(index_file, encoding="utf-8") as f:
+        old_slugs = {s["slug"] for s in json.load(f)["shards"]}
+    for slug in sorted(old_slugs - slugs):
+        if os.path.exists(f"{out_dir}/{slug}.json"):
+            print("Removing catalogue shard for", slug)
+            os.remove(f"{out_dir}/{slug}.json")
@@ -0,0 +1,219 @@
+"""Checkpoints of harvested repo metadata."""
+
+from concurrent.futures import Future
+from datetime import datetime
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+from github.GitRelease import GitRelease
+from github.Repository import Repository
+
+
+def format_timestamp(timestamp: Optional[datetime]) -> str:
+    """Formats an optional timestamp for a repo version."""
+    return timestamp.isoformat() if timestamp is not None else "-"
+
+
+def get_repo_version(repo: Repository, releases: list[GitRelease]) -> str:
+    """Returns a string that changes whenever a repo is modified.
+
+    Besides the push and update times of the repo, the version includes
+    the latest release and its assets, since publishing a release or
+    uploading assets changes neither of them.
+
+    Args:
+        repo (Repository): score repository
+        releases (list[GitRelease]): releases of the repo (latest first)
+
+    Returns:
+        str: version of the repo
+    """
+    parts = [format_timestamp(repo.pushed_at),
+             format_timestamp(repo.updated_at)]
+    if releases:
+        latest = releases[0]
+        parts.append(f"{latest.id}:{latest.tag_name}:"
+                     f"{format_timestamp(latest.updated_at)}")
+        parts.extend(f"{asset.id}:{format_timestamp(asset.updated_at)}"
+                     for asset in latest.assets)
+    return "|".join(parts)
+
+
+def write_json_atomic(data: dict, file: str) -> None:
+    """Writes a JSON file atomically (via a temporary file in the same dir).
+
+    Args:
+        data (dict): data to write
+        file (str): output file
+    """
+    out_dir = os.path.dirname(file) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def copy_metadata(metadata: Any) -> Any:
+    """Returns a deep copy of JSON-serializable metadata."""
+    return json.loads(json.dumps(metadata))
+
+
+class HarvestCheckpoint:
+    """Stores the unformatted metadata of each harvested repo on disk.
+
+    Each entry records the repo version at harvest time, so that entries
+    of repos that changed since then are not reused. The (formatted)
+    works of collection repos are stored as well, so that the checkpoint
+    can serve as harvest state for rebuilding single repos.
+    """
+
+    def __init__(self, file: str, resume: bool = False) -> None:
+        """Initializes the checkpoint.
+
+        Args:
+            file (str): JSON file with the checkpoint
+            resume (bool): whether to reuse entries of an existing file
+        """
+        self.file = file
+        self.repos: dict[str, dict] = {}
+        self.collections: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(file):
+            with open(file, encoding="utf-8") as f:
+                data = json.load(f)
+            self.repos = data["repos"]
+            self.collections = data.get("collections", {})
+            print(f"Resuming from {file} ({len(self.repos)} repos)")
+
+    def get(self,
+            repo: Repository,
+            releases: list[GitRelease]) -> tuple[bool, Optional[dict]]:
+        """Looks up the metadata of a repo.
+
+        Args:
+            repo (Repository): score repository
+            releases (list[GitRelease]): releases of the repo (latest first)
+
+        Returns:
+            tuple[bool, Optional[dict]]: whether a valid entry exists,
+              and the metadata (None for ignored repos)
+        """
+        entry = self.repos.get(repo.name)
+        if (entry is None
+                or entry["version"] != get_repo_version(repo, releases)):
+            return False, None
+        return True, copy_metadata(entry["metadata"])
+
+    def get_all(self) -> list[dict]:
+        """Returns the metadata of all repos that are not ignored.
+
+        Returns:
+            list[dict]: unformatted work metadata
+        """
+        with self._lock:
+            return [copy_metadata(e["metadata"]) for e in self.repos.values()
+                    if e["metadata"] is not None]
+
+    def save(self,
+             repo: Repository,
+             releases: list[GitRelease],
+             metadata: Optional[dict]) -> None:
+        """Adds the metadata of a repo and writes the checkpoint.
+
+        Args:
+            repo (Repository): score repository
+            releases (list[GitRelease]): releases of the repo (latest first)
+            metadata (Optional[dict]): metadata (None for ignored repos)
+        """
+        version = get_repo_version(repo, releases)
+        with self._lock:
+            self.repos[repo.name] = {"version": version,
+                                     "metadata": copy_metadata(metadata)}
+            self._write()
+
+    def save_collection(self, slug: str, works: list[dict]) -> None:
+        """Adds the works of a collection repo and writes the checkpoint.
+
+        Args:
+            slug (str): slug of the composer
+            works (list[dict]): formatted work metadata
+        """
+        with self._lock:
+            self.collections[slug] = copy_metadata(works)
+            self._write()
+
+    def merge(self, repos: dict, collections: dict) -> None:
+        """Adds the entries of another checkpoint and writes the checkpoint.
+
+        Args:
+            repos (dict): repo entries of the other checkpoint
+            collections (dict): collection works of the other checkpoint
+        """
+        with self._lock:
+            self.repos.update(repos)
+            self.collections.update(collections)
+            self._write()
+
+    def _write(self) -> None:
+        """Writes the checkpoint (the caller must hold the lock)."""
+        write_json_atomic({"repos": self.repos,
+                           "collections": self.collections},
+                          self.file)
+
+    def save_when_done(self,
+                       repo: Repository,
+                       releases: list[GitRelease],
+                       metadata: dict) -> None:
+        """Saves metadata as soon as all release dates are available.
+
+        Args:
+            repo (Repository): score repository
+            releases (list[GitRelease]): releases of the repo (latest first)
+            metadata (dict): metadata whose release dates are futures
+        """
+        futures = [r["date"] for r in metadata["releases"]]
+        pending = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_: Future) -> None:
+            with lock:
+                pending[0] -= 1
+                if pending[0] > 0:
+                    return
+            if any(f.exception() is not None for f in futures):
+                return
+            for release, future in zip(metadata["releases"], futures):
+                release["date"] = future.result()
+            self.save(repo, releases, metadata)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def remove(self, repo_name: str) -> None:
+        """Removes a repo and writes the checkpoint.
+
+        Args:
+            repo_name (str): name of the repo
+        """
+        with self._lock:
+            self.repos.pop(repo_name, None)
+            self._write()
+
+    def prune(self, repo_names: set[str]) -> None:
+        """Removes repos that no longer exist.
+
+        Args:
+            repo_names (set[str]): names of all current repos
+        """
+        with self._lock:
+            self.repos = {k: v for k, v in self.repos.items()
+                          if k in repo_names}
@@ -5,17 +5,27 @@ import os
 from collections import namedtuple
 import re
 import tempfile
+from typing import Optional
 
 import dateutil.parser
-from git import Repo, Tag
+from git import Tag
 from github.Organization import Organization
 import strictyaml  # type: ignore
 
+from fragment_cache import FragmentCache, get_fragment
+from git_source import GIT_TIMEOUT, clone_tag, format_timestamp
+from scheduler import RequestScheduler
+
 LICENSES = {
     "cc-by-sa-4.0": "![CC BY-SA 4.0](/assets/images/license_cc-by-sa.svg){:width='120px'}",
     "cc-by-nc-sa-4.0": "![CC BY-NC-SA 4.0](/assets/images/license_cc-by-nc-sa.svg){:width='120px'}"
 }
 
+LICENSES_HTML = {
+    "cc-by-sa-4.0": '<img src="/assets/images/license_cc-by-sa.svg" alt="CC BY-SA 4.0" width="120px">',
+    "cc-by-nc-sa-4.0": '<img src="/assets/images/license_cc-by-nc-sa.svg" alt="CC BY-NC-SA 4.0" width="120px">'
+}
+
 FULL_SCORE_NAME = "full&nbsp;score"
 
 PART_REPLACE = {
@@ -66,16 +76,23 @@ SLUG_REPLACE = {
 RELEASE_TEMPLATE = ("[{version}](https://github.com/{org}/"
                     "{repo}/releases/tag/{version})&nbsp;({date})")
 
-ASSET_LINK_GH = ("(https://github.com/{org}/"
-                 "{repo}/releases/download/{version}/{file})"
-                 "{{: .asset-link{cls}}}")
+ASSET_URL_GH = ("https://github.com/{org}/"
+                "{repo}/releases/download/{version}/{file}")
+
+ASSET_URL_SERVER = ("https://edition.esser-skala.at/assets/"
+                    "pdf/{repo}/{work}/{file}")
 
-ASSET_LINK_SERVER = ("(https://edition.esser-skala.at/assets/"
-                     "pdf/{repo}/{work}/{file})"
-                     "{{: .asset-link{cls}}}")
+ASSET_LINK = "({url}){{: .asset-link{cls}}}"
+
+ASSET_LINK_HTML = '<a href="{url}" class="asset-link{cls}">{name}</a>'
+
+MIDI_FILE = "midi_collection.zip"
 
 TABLEROW_TEMPLATE = "|[{id}](#work-{id_slug})|{title}|{genre}|"
 
+TABLEROW_TEMPLATE_HTML = ('<tr><td><a href="#work-{id_slug}">{id}</a></td>'
+                          "<td>{title}</td><td>{genre}</td></tr>")
+
 INTRO_TEMPLATE = """\
 |<span class="label-col">born</span>|{born}|
 |<span class="label-col">died</span>|{died}|
@@ -120,6 +137,28 @@ REFERENCE_TEMPLATE = {
 Composer = namedtuple("Composer", "first last suffix", defaults=[""])
 
 
+def get_composer_names(composer: Composer) -> tuple[str, str]:
+    """Returns page title and slug of a composer.
+
+    Args:
+        composer (Composer): the composer
+
+    Returns:
+        tuple[str, str]: page title and slug
+    """
+    if composer.last == "Anonymus":
+        title = composer.last
+        slug = composer.last
+    elif composer.suffix == "":
+        title = f"{composer.last}, {composer.first}"
+        slug = f"{composer.first}-{composer.last}"
+    else:
+        title = f"{composer.last} {composer.suffix}, {composer.first}"
+        slug = f"{composer.first}-{composer.last}-{composer.suffix}"
+
+    return title, slugify(slug)
+
+
 def format_metadata(metadata: dict, gh_org_name: str) -> dict:
     """Formats metadata.
 
@@ -154,6 +193,7 @@ def format_metadata(metadata: dict, gh_org_name: str) -> dict:
     metadata["scoring"] = latex_to_text(metadata["scoring"])
 
     # misc fields
+    metadata["license_id"] = metadata["license"]
     metadata["license"] = LICENSES[metadata["license"]]
     metadata["id_slug"] = slugify(metadata["id"])
 
@@ -176,26 +216,32 @@ def format_metadata(metadata: dict, gh_org_name: str) -> dict:
 
     # asset links
     if "assets" in metadata:
-        assets = {
-            make_part_name(asset_file, ".pdf"):
-            ASSET_LINK_GH.format(
+        metadata["asset_urls"] = {
+            asset_file:
+            ASSET_URL_GH.format(
                 org=gh_org_name,
                 repo=metadata["repo"],
                 version=current_release["version"],
-                file=asset_file,
-                cls=".full-score" if asset_file == "full_score.pdf" else ""
+                file=asset_file
             )
             for asset_file in metadata["assets"]
         }
+        add_asset_links(metadata)
+
+    return metadata
 
-        midi_file = "midi_collection.zip"
-        if midi_file in assets:
-            metadata["midi"] = assets[midi_file]
-            del assets[midi_file]
 
-        metadata["asset_links"] = format_asset_list(assets)
+def add_asset_links(metadata: dict) -> None:
+    """Adds the markdown links for the asset URLs of a work.
 
-    return metadata
+    Args:
+        metadata (dict): work metadata with asset URLs
+    """
+    assets = dict(metadata["asset_urls"])
+    midi_url = assets.pop(MIDI_FILE, None)
+    if midi_url is not None:
+        metadata["midi"] = ASSET_LINK.format(url=midi_url, cls="")
+    metadata["asset_links"] = format_asset_list(assets)
 
 
 def latex_to_text(s: str) -> str:
@@ -225,7 +271,7 @@ def make_part_name(filename: str, extension: str) -> str:
     Returns:
         str: Reformatted part name.
     """
-    if filename == "midi_collection.zip":
+    if filename == MIDI_FILE:
         return filename
 
     name = filename.removesuffix(extension)
@@ -253,14 +299,14 @@ def slugify(s: str) -> str:
     return slug
 
 
-def format_asset_list(assets: dict) -> str:
-    """Formats a dict of assets: sort and move full score to the front.
+def sort_asset_names(assets: dict) -> list[str]:
+    """Sorts the part names of assets and moves the full score to the front.
 
     Args:
-        assets (dict): dict with assets
+        assets (dict): dict with assets (part name -> URL)
 
     Returns:
-        str: assets as included on webpage
+        list[str]: sorted part names
     """
     asset_names = sorted(assets.keys())
     try:
@@ -268,7 +314,36 @@ def format_asset_list(assets: dict) -> str:
         asset_names.insert(0, FULL_SCORE_NAME)
     except ValueError:
         pass
-    return " ".join([f"[{k}]{assets[k]}" for k in asset_names])
+    return asset_names
+
+
+def format_asset_list(assets: dict, html: bool = False) -> str:
+    """Formats a dict of assets: sort and move full score to the front.
+
+    Args:
+        assets (dict): dict with assets (file name -> URL)
+        html (bool): whether to emit HTML instead of markdown
+
+    Returns:
+        str: assets as included on webpage
+    """
+    urls = {make_part_name(k, ".pdf"): v for k, v in assets.items()}
+    if html:
+        return " ".join([
+            ASSET_LINK_HTML.format(
+                url=urls[k],
+                cls=" full-score" if k == FULL_SCORE_NAME else "",
+                name=k
+            )
+            for k in sort_asset_names(urls)
+        ])
+    return " ".join([
+        f"[{k}]" + ASSET_LINK.format(
+            url=urls[k],
+            cls=".full-score" if k == FULL_SCORE_NAME else ""
+        )
+        for k in sort_asset_names(urls)
+    ])
 
 
 def format_work_entry(work: dict) -> str:
@@ -341,17 +416,115 @@ def format_work_entry(work: dict) -> str:
     return "\n".join(res)
 
 
-def get_work_list(works: list) -> tuple[list[str], list[str]]:
-    """Get work table rows and work details.
+def format_work_entry_html(work: dict) -> str:
+    """Formats the work entry as HTML."""
+
+    # title
+    title = (
+        '<h3 id="work-{id_slug}">{title}<br/>'
+        '<span class="work-subtitle">{subtitle}</span></h3>'
+    )
+    res = [title.format(**work), '<table class="work-table">', "<tbody>"]
+
+    # table rows
+    row = '<tr><td><span class="label-col">{}</span></td><td>{}</td></tr>'
+    link = '<a href="{}">{}</a>'
+
+    ## genre
+    res.append(row.format("genre", work["genre"]))
+
+    ## festival (optional)
+    if "festival" in work:
+        res.append(row.format("festival", work["festival"]))
+
+    ## scoring
+    res.append(row.format("scoring", work["scoring"]))
+
+    ## full score and parts
+    assets = dict(work["asset_urls"])
+    midi_url = assets.pop(MIDI_FILE, None)
+    res.append(row.format("scores", format_asset_list(assets, html=True)))
+
+    ## MIDI collection (optional)
+    if midi_url is not None:
+        res.append(
+            row.format(
+                "MIDI",
+                ASSET_LINK_HTML.format(url=midi_url,
+                                       cls="",
+                                       name='<i class="fas fa-music"></i>')
+            )
+        )
+
+    ## IMSLP link (optional)
+    if "imslp" in work:
+        res.append(
+            row.format(
+                "IMSLP",
+                link.format(f"https://imslp.org/wiki/{work['imslp']}",
+                            "scores and parts")
+            )
+        )
+
+    ## link to printed edition (optional)
+    if "asin" in work:
+        res.append(
+            row.format(
+                "print",
+                link.format(f"https://amazon.de/dp/{work['asin']}",
+                            "full score")
+            )
+        )
+
+    ## source code
+    res.append(
+        row.format(
+            "source",
+            link.format(
+                f"https://github.com/edition-esser-skala/{work['repo']}",
+                "GitHub"
+            )
+        )
+    )
+
+    ## license
+    res.append(row.format("license", LICENSES_HTML[work["license_id"]]))
+
+    res += ["</tbody>", "</table>\n"]
+
+    return "\n".join(res)
+
+
+def get_row_sort_key(work: dict) -> str:
+    """Returns the key that orders the table rows (by ID)."""
+    return TABLEROW_TEMPLATE.format(**work)
+
+
+def get_details_sort_key(work: dict) -> str:
+    """Returns the key that orders the work details (by title)."""
+    return f"{work['title']}<br/>{work['subtitle']}"
+
+
+def get_work_list(works: list,
+                  html: bool = False) -> tuple[list[str], list[str]]:
+    """Get work table rows (sorted by ID) and work details (sorted by title).
 
     Args:
-        works (list): works
+        works (list): works, already sorted by `get_details_sort_key`
+          (e.g., a slice of the works table)
+        html (bool): whether to emit HTML instead of markdown
 
     Returns:
         tuple[str, str]: table rows and work details
     """
-    table_rows = [TABLEROW_TEMPLATE.format(**w) for w in works]
-    work_details = [format_work_entry(w) for w in works]
+    works_by_id = sorted(works, key=get_row_sort_key)
+
+    if html:
+        table_rows = [TABLEROW_TEMPLATE_HTML.format(**w) for w in works_by_id]
+        work_details = [format_work_entry_html(w) for w in works]
+    else:
+        table_rows = [TABLEROW_TEMPLATE.format(**w) for w in works_by_id]
+        work_details = [format_work_entry(w) for w in works]
     return table_rows, work_details
 
 
@@ -382,18 +555,38 @@ def format_reference(ref: dict) -> str:
     return REFERENCE_TEMPLATE[ref["type"]].format(**ref)
 
 
-def parse_composer_details(file: str) -> str:
+def parse_composer_details(file: str,
+                           cache: Optional[FragmentCache] = None) -> str:
     """Parse composer details (dates, links, cv ...) from a YAML file.
 
     Args:
         file (str): YAML file with composer details
+        cache (Optional[FragmentCache]): cache for the formatted details
 
     Returns:
         str: Markdown string to be included in the webpage
     """
 
     with open(file, encoding="utf8") as f:
-        data = strictyaml.load(f.read()).data
+        content = f.read()
+
+    return get_fragment(
+        cache,
+        "composer_intro",
+        content,
+        lambda: format_composer_details(strictyaml.load(content).data)
+    )
+
+
+def format_composer_details(data: dict) -> str:
+    """Format composer details (dates, links, cv ...).
+
+    Args:
+        data (dict): composer details
+
+    Returns:
+        str: Markdown string to be included in the webpage
+    """
 
     # born date and possibly location
     born = "(unknown)"
@@ -456,18 +649,34 @@ def get_tag_date(tag: Tag) -> str:
 
 
 def get_collection_works(repo: str,
-                         gh_org: Organization) -> tuple[list[str], list[str]]:
-    """Generates a markdown page for a project."""
+                         gh_org: Organization,
+                         scheduler: RequestScheduler) -> list[dict]:
+    """Collects work metadata from the latest tag of a collection repo.
+
+    Args:
+        repo (str): name of the collection repository
+        gh_org (Organization): GitHub organization
+        scheduler (RequestScheduler): scheduler for GitHub requests
+
+    Returns:
+        list[dict]: work metadata, sorted by title
+    """
 
     print("  -> Adding collection repository", repo)
-    last_tag = gh_org.get_repo(repo).get_tags()[0]
+    last_tag = scheduler.call("latest_tag",
+                              lambda: gh_org.get_repo(repo).get_tags()[0])
 
     with tempfile.TemporaryDirectory() as repo_dir:
-        Repo.clone_from(
+        clone = scheduler.resilience.call(
+            "git_clone",
+            clone_tag,
             f"https://github.com/edition-esser-skala/{repo}",
+            last_tag.name,
             repo_dir,
-            multi_options=["--depth 1", f"--branch {last_tag.name}"]
+            deadline=GIT_TIMEOUT + 10
         )
+        release = {"version": last_tag.name,
+                   "date": format_timestamp(clone.head.commit.committed_date)}
 
         try:
             with open(f"{repo_dir}/ignored_works", encoding="utf8") as f:
@@ -491,39 +700,27 @@ def get_collection_works(repo: str,
                       encoding="utf-8") as f:
                 metadata = strictyaml.load(f.read()).data
 
+            metadata["repo"] = repo
+            metadata["work_dir"] = work_dir
+            metadata["releases"] = [release]
             metadata = format_metadata(metadata, gh_org.login)
 
-            assets = {
-                make_part_name(score, ".ly"):
-                ASSET_LINK_SERVER.format(
-                    repo=repo,
-                    work=work_dir,
-                    file=score.replace(".ly", ".pdf"),
-                    cls=".full-score" if score == "full_score.ly" else ""
-                )
+            files = [
+                score.replace(".ly", ".pdf")
                 for score in os.listdir(f"{repo_dir}/works/{work_dir}/scores")
-            }
-            metadata["asset_links"] = format_asset_list(assets)
-
+            ]
             if os.path.isdir(f"{repo_dir}/works/{work_dir}/midi"):
-                metadata["midi"] = (
-                    f"(https://edition.esser-skala.at/assets/pdf/{repo}/"
-                    f"{work_dir}/midi_collection.zip){{: .asset-link}}"
-                )
-
-            metadata["latest_release"] = RELEASE_TEMPLATE.format(
-                version=last_tag.name,
-                org=gh_org.login,
-                repo=repo,
-                date=get_tag_date(last_tag)
-            )
-            metadata["repo"] = repo
+                files.append(MIDI_FILE)
+
+            metadata["asset_urls"] = {
+                file: ASSET_URL_SERVER.format(repo=repo,
+                                              work=work_dir,
+                                              file=file)
+                for file in files
+            }
+            add_asset_links(metadata)
 
             works.append(metadata)
         works.sort(key=itemgetter("title"))
 
-    # create table rows and work details
-    table_rows = [TABLEROW_TEMPLATE.format(**w) for w in works]
-    work_details = [format_work_entry(w) for w in works]
-
-    return table_rows, work_details
+    return works
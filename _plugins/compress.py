@@ -0,0 +1,235 @@
+"""Precompressed variants of the built site for Apache."""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import hashlib
+import os
+import re
+import shutil
+from typing import Optional
+
+try:
+    import brotli  # type: ignore
+except ModuleNotFoundError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css": "text/css",
+    ".html": "text/html",
+    ".js": "text/javascript",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain",
+    ".xml": "application/xml"
+}
+
+MIN_SIZE = 1024
+
+COMPRESSION_CACHE = ".cache/compressed"
+
+HTACCESS_ENCODING_RULES = """\
+RewriteCond %{{HTTP:Accept-Encoding}} {encoding}
+RewriteCond %{{REQUEST_FILENAME}}.{ext} -s
+RewriteRule ^(.+)\\.({extensions})$ $1.$2.{ext} [QSA]
+"""
+
+HTACCESS_TYPE_RULE = """\
+RewriteRule \\{extension}\\.{ext}$ - [T={mime_type},E=no-gzip:1,E=no-brotli:1]
+"""
+
+HTACCESS_HEADER_RULES = """\
+<IfModule mod_headers.c>
+  <FilesMatch "\\.({extensions})\\.{ext}$">
+    Header set Content-Encoding {encoding}
+    Header append Vary Accept-Encoding
+  </FilesMatch>
+</IfModule>
+"""
+
+
+def get_encodings() -> dict[str, str]:
+    """Returns the available encodings and their file extensions.
+
+    Brotli is only used if the brotli package is installed.
+
+    Returns:
+        dict[str, str]: file extension for each encoding
+    """
+    encodings = {"gzip": "gz"}
+    if brotli is not None:
+        encodings = {"br": "br", **encodings}
+    return encodings
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    """Compresses data with maximum compression.
+
+    Args:
+        data (bytes): data to compress
+        encoding (str): "br" or "gzip"
+
+    Returns:
+        bytes: compressed data
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_file(file: str, cache_dir: str) -> dict:
+    """Writes the compressed variants of a file.
+
+    Compressed variants are cached by the hash of the file content, so
+    that unchanged files are not compressed again.
+
+    Args:
+        file (str): file to compress
+        cache_dir (str): directory with cached compressed variants
+
+    Returns:
+        dict: sizes of the variants and used cache files
+    """
+    with open(file, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    sizes: dict[str, int] = {}
+    cached: list[str] = []
+    n_compressed = 0
+    for encoding, ext in get_encodings().items():
+        cache_file = f"{cache_dir}/{digest}.{ext}"
+        if not os.path.exists(cache_file):
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(encode(data, encoding))
+            os.replace(tmp_file, cache_file)
+            n_compressed += 1
+        shutil.copyfile(cache_file, f"{file}.{ext}")
+        sizes[encoding] = os.path.getsize(cache_file)
+        cached.append(os.path.basename(cache_file))
+
+    return {"size": len(data),
+            "cached": cached,
+            "compressed": n_compressed,
+            **sizes}
+
+
+def find_compressible_files(site_dir: str) -> list[str]:
+    """Finds files that benefit from precompression.
+
+    Args:
+        site_dir (str): directory with the built site
+
+    Returns:
+        list[str]: files
+    """
+    files = []
+    for root, _, filenames in os.walk(site_dir):
+        for filename in filenames:
+            file = os.path.join(root, filename)
+            if (os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS
+                    and os.path.getsize(file) >= MIN_SIZE):
+                files.append(file)
+    return sorted(files)
+
+
+def update_htaccess(file: str, name: str, rules: str) -> None:
+    """Adds or replaces a block of rules in an .htaccess file.
+
+    Args:
+        file (str): .htaccess file
+        name (str): name of the block
+        rules (str): rules
+    """
+    content = ""
+    if os.path.exists(file):
+        with open(file, encoding="utf-8") as f:
+            content = f.read()
+
+    block = f"# BEGIN {name}\n{rules}# END {name}\n"
+    pattern = re.compile(
+        f"# BEGIN {re.escape(name)}\n.*?# END {re.escape(name)}\n",
+        re.DOTALL
+    )
+    if pattern.search(content):
+        content = pattern.sub(lambda _: block, content)
+    else:
+        content = content.rstrip("\n") + "\n\n" + block
+
+    with open(file, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def make_htaccess_rules() -> str:
+    """Creates rules that serve precompressed variants with correct headers.
+
+    Returns:
+        str: .htaccess rules
+    """
+    extensions = "|".join(e[1:] for e in COMPRESSIBLE_EXTENSIONS)
+    rules = []
+    for encoding, ext in get_encodings().items():
+        rules.append(HTACCESS_ENCODING_RULES.format(encoding=encoding,
+                                                    ext=ext,
+                                                    extensions=extensions))
+        rules += [HTACCESS_TYPE_RULE.format(extension=extension,
+                                            ext=ext,
+                                            mime_type=mime_type)
+                  for extension, mime_type in COMPRESSIBLE_EXTENSIONS.items()]
+        rules.append(HTACCESS_HEADER_RULES.format(encoding=encoding,
+                                                  ext=ext,
+                                                  extensions=extensions))
+    return "\n".join(rules)
+
+
+def compress_site(site_dir: str,
+                  cache_dir: str = COMPRESSION_CACHE,
+                  max_workers: Optional[int] = None) -> None:
+    """Precompresses the built site and adds the corresponding .htaccess rules.
+
+    Args:
+        site_dir (str): directory with the built site
+        cache_dir (str): directory with cached compressed variants
+        max_workers (Optional[int]): number of processes (default: number
+          of CPUs)
+    """
+    if brotli is None:
+        print("brotli is not installed, only creating gzip variants")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    files = find_compressible_files(site_dir)
+    with ProcessPoolExecutor(max_workers) as executor:
+        results = list(executor.map(compress_file,
+                                    files,
+                                    [cache_dir] * len(files),
+                                    chunksize=16))
+
+    # remove cached variants of files that no longer exist
+    used = {c for r in results for c in r["cached"]}
+    for cache_file in os.listdir(cache_dir):
+        if cache_file not in used:
+            os.remove(os.path.join(cache_dir, cache_file))
+
+    update_htaccess(os.path.join(site_dir, ".htaccess"),
+                    "precompressed files",
+                    make_htaccess_rules())
+
+    total = sum(r["size"] for r in results)
+    n_compressed = sum(r["compressed"] > 0 for r in results)
+    print(f"Precompressed {len(files)} files "
+          f"({n_compressed} changed, {len(files) - n_compressed} cached)")
+    for encoding in get_encodings():
+        size = sum(r[encoding] for r in results)
+        print(f"  -> {encoding}: {total / 1024:.0f} KiB -> "
+              f"{size / 1024:.0f} KiB "
+              f"({100 * (1 - size / max(total, 1)):.1f}% saved)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("site_dir",
+                        nargs="?",
+                        default="_site",
+                        help="directory with the built site")
+    compress_site(parser.parse_args().site_dir)
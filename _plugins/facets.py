@@ -0,0 +1,132 @@
+"""Faceted indexes of all works across composers."""
+
+import heapq
+import os
+import re
+from typing import Callable, Iterable
+
+import pandas as pd
+
+from catalogue import serialize
+
+FACETS_URL = "/assets/catalogue/facets"
+
+# number of works in the list of recent releases
+N_RECENT = 20
+
+# commas outside of parentheses
+SCORING_SEPARATOR = re.compile(r",(?![^()]*\))")
+
+# leading number of instruments ("2 vl") and trailing remarks ("(ad lib.)")
+SCORING_COUNT = re.compile(r"^\d+\s+")
+SCORING_REMARK = re.compile(r"\s*\((?:ad lib|solo|opt)[^)]*\)$")
+
+
+def parse_scoring(scoring: str) -> list[str]:
+    """Extracts the instruments and voices of a scoring.
+
+    Args:
+        scoring (str): scoring, e.g. "S, A, T, B, 2 ob d'amore, 2 vl, bc"
+
+    Returns:
+        list[str]: instruments and voices without their number, e.g.
+          ["S", "A", "T", "B", "ob d'amore", "vl", "bc"]
+    """
+    instruments = []
+    for part in SCORING_SEPARATOR.split(scoring):
+        part = SCORING_REMARK.sub("", SCORING_COUNT.sub("", part.strip()))
+        if part and part not in instruments:
+            instruments.append(part)
+    return instruments
+
+
+# values of each facet for a work
+FACETS: dict[str, Callable[[dict], Iterable[str]]] = {
+    "genre": lambda w: [w["genre"]],
+    "festival": lambda w: [w["festival"]] if "festival" in w else [],
+    "instrument": lambda w: parse_scoring(w["scoring"]),
+    "license": lambda w: [w["license_id"]],
+    "release_year": lambda w: [w["releases"][0]["date"][:4]]
+}
+
+
+def make_work_summary(work: dict, composer_title: str, slug: str) -> dict:
+    """Extracts the fields of a work that are shown in facet lists.
+
+    Args:
+        work (dict): work metadata
+        composer_title (str): page title of the composer
+        slug (str): slug of the composer
+
+    Returns:
+        dict: work summary
+    """
+    return {"id": work["id"],
+            "title": work["title"],
+            "genre": work["genre"],
+            "composer": composer_title,
+            "url": f"/scores/{slug}/#work-{work['id_slug']}",
+            "version": work["releases"][0]["version"],
+            "date": work["releases"][0]["date"]}
+
+
+def build_facets(table: pd.DataFrame) -> tuple[list, dict, list]:
+    """Builds inverted indexes of all facets in a single pass over the works.
+
+    Args:
+        table (pd.DataFrame): works table
+
+    Returns:
+        tuple[list, dict, list]: summary of each work; for each facet, the
+          indices of the works with each value; indices of the most
+          recently released works
+    """
+    summaries: list[dict] = []
+    facets: dict[str, dict[str, list[int]]] = {f: {} for f in FACETS}
+    for work, composer_title, slug in zip(table["record"],
+                                          table["composer_title"],
+                                          table["composer_slug"]):
+        index = len(summaries)
+        summaries.append(make_work_summary(work, composer_title, slug))
+        for facet, get_values in FACETS.items():
+            for value in get_values(work):
+                facets[facet].setdefault(value, []).append(index)
+
+    recent = heapq.nlargest(N_RECENT,
+                            range(len(summaries)),
+                            key=lambda i: (summaries[i]["date"], -i))
+    return summaries, facets, recent
+
+
+def write_facets(table: pd.DataFrame, out_dir: str) -> None:
+    """Writes the works, one index per facet and the recent releases as JSON.
+
+    Facet indexes map each value to the indices of its works in
+    works.json, so that clients only load the facets they display.
+
+    Args:
+        table (pd.DataFrame): works table
+        out_dir (str): output directory
+    """
+    summaries, facets, recent = build_facets(table)
+    print(f"Generating facets for {len(summaries)} works")
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(f"{out_dir}/works.json", "wb") as f:
+        f.write(serialize({"works": summaries}))
+
+    for facet, index in facets.items():
+        with open(f"{out_dir}/{facet}.json", "wb") as f:
+            f.write(serialize(index))
+
+    with open(f"{out_dir}/recent.json", "wb") as f:
+        f.write(serialize({"works": [summaries[i] for i in recent]}))
+
+    with open(f"{out_dir}/index.json", "wb") as f:
+        f.write(serialize({
+            "works": f"{FACETS_URL}/works.json",
+            "recent": f"{FACETS_URL}/recent.json",
+            "facets": {facet: {"url": f"{FACETS_URL}/{facet}.json",
+                               "values": {v: len(i) for v, i in index.items()}}
+                       for facet, index in facets.items()}
+        }))
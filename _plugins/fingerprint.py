@@ -0,0 +1,182 @@
+"""Content-hashed file names for static assets of the built site."""
+
+import argparse
+import hashlib
+import os
+import re
+from typing import Optional
+
+from compress import update_htaccess
+
+# assets that get a fingerprinted copy
+FINGERPRINT_EXTENSIONS = {".avif", ".css", ".gif", ".ico", ".jpeg", ".jpg",
+                          ".js", ".json", ".png", ".svg", ".webp", ".woff",
+                          ".woff2"}
+
+# files whose references to assets are rewritten (and assets that may
+# contain references themselves)
+TEXT_EXTENSIONS = {".css", ".html", ".js", ".json", ".svg", ".webmanifest",
+                   ".xml"}
+
+# directories whose files keep fixed URLs only (header image derivatives
+# already contain the hash of their source image)
+EXCLUDED_DIRS = {"assets/images/derived", "assets/pdf"}
+
+ASSET_PATH = re.compile(r"/assets/[\w./%-]+")
+
+HASH_LENGTH = 10
+
+# fingerprinted assets, and header image derivatives (whose file names
+# contain the hash of their source image)
+HTACCESS_RULES = """\
+<IfModule mod_headers.c>
+  <FilesMatch "\\.[0-9a-f]{{{hash_length}}}\\.({extensions})(\\.gz|\\.br)?$">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
+  <FilesMatch "-[0-9a-f]{{8}}-[0-9]+\\.(avif|jpg|webp)$">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
+</IfModule>
+"""
+
+
+def get_fingerprinted_path(path: str, content: bytes) -> str:
+    """Inserts the content hash into a file name.
+
+    Args:
+        path (str): path of the file
+        content (bytes): content of the file
+
+    Returns:
+        str: path with the hash before the extension
+    """
+    root, ext = os.path.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f"{root}.{digest}{ext}"
+
+
+def find_assets(site_dir: str) -> dict[str, str]:
+    """Finds the assets that get a fingerprinted copy.
+
+    Args:
+        site_dir (str): directory with the built site
+
+    Returns:
+        dict[str, str]: file of each asset URL
+    """
+    assets = {}
+    hashed = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.\w+$")
+    for root, _, filenames in os.walk(f"{site_dir}/assets"):
+        rel_root = os.path.relpath(root, site_dir)
+        if any(rel_root == d or rel_root.startswith(d + os.sep)
+               for d in EXCLUDED_DIRS):
+            continue
+        for filename in filenames:
+            if (os.path.splitext(filename)[1] in FINGERPRINT_EXTENSIONS
+                    and not hashed.search(filename)):
+                file = os.path.join(root, filename)
+                assets["/" + os.path.relpath(file, site_dir)] = file
+    return assets
+
+
+def rewrite_references(content: str, fingerprinted: dict[str, str]) -> str:
+    """Replaces asset URLs by their fingerprinted URLs.
+
+    Args:
+        content (str): content of a text file
+        fingerprinted (dict[str, str]): fingerprinted URL of each asset URL
+
+    Returns:
+        str: content with rewritten references
+    """
+    return ASSET_PATH.sub(lambda m: fingerprinted.get(m[0], m[0]), content)
+
+
+def fingerprint_site(site_dir: str) -> dict[str, str]:
+    """Adds fingerprinted copies of all assets and rewrites references.
+
+    Original files are kept, so that external links to fixed URLs keep
+    working. Assets that reference other assets (CSS, JS, JSON, SVG) are
+    fingerprinted after their references have been rewritten, so that
+    their hash changes whenever a referenced asset changes. Assets in a
+    reference cycle keep their fixed URLs.
+
+    Args:
+        site_dir (str): directory with the built site
+
+    Returns:
+        dict[str, str]: fingerprinted URL of each asset URL
+    """
+    assets = find_assets(site_dir)
+    fingerprinted: dict[str, str] = {}
+    in_progress: set[str] = set()
+
+    def process(url: str) -> Optional[str]:
+        """Fingerprints an asset after all assets it references."""
+        if url in fingerprinted:
+            return fingerprinted[url]
+        if url in in_progress:
+            return None
+        in_progress.add(url)
+
+        file = assets[url]
+        with open(file, "rb") as f:
+            content = f.read()
+
+        if os.path.splitext(file)[1] in TEXT_EXTENSIONS:
+            text = content.decode("utf-8")
+            for ref in set(ASSET_PATH.findall(text)):
+                if ref in assets and ref != url:
+                    process(ref)
+            if any(ref in in_progress and ref != url
+                   for ref in ASSET_PATH.findall(text)):
+                in_progress.discard(url)
+                return None
+            text = rewrite_references(text, fingerprinted)
+            content = text.encode("utf-8")
+            with open(file, "wb") as f:
+                f.write(content)
+
+        in_progress.discard(url)
+        fingerprinted[url] = get_fingerprinted_path(url, content)
+        with open(site_dir + fingerprinted[url], "wb") as f:
+            f.write(content)
+        return fingerprinted[url]
+
+    for url in sorted(assets):
+        process(url)
+
+    # rewrite references in pages and other text files
+    n_rewritten = 0
+    for root, _, filenames in os.walk(site_dir):
+        for filename in filenames:
+            file = os.path.join(root, filename)
+            if ("/" + os.path.relpath(file, site_dir) in assets
+                    or os.path.splitext(filename)[1] not in TEXT_EXTENSIONS):
+                continue
+            with open(file, encoding="utf-8") as f:
+                text = f.read()
+            rewritten = rewrite_references(text, fingerprinted)
+            if rewritten != text:
+                n_rewritten += 1
+                with open(file, "w", encoding="utf-8") as f:
+                    f.write(rewritten)
+
+    extensions = "|".join(sorted(e[1:] for e in FINGERPRINT_EXTENSIONS))
+    update_htaccess(os.path.join(site_dir, ".htaccess"),
+                    "fingerprinted assets",
+                    HTACCESS_RULES.format(hash_length=HASH_LENGTH,
+                                          extensions=extensions))
+
+    print(f"Fingerprinted {len(fingerprinted)} of {len(assets)} assets, "
+          f"rewrote references in {n_rewritten} files")
+    return fingerprinted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("site_dir",
+                        nargs="?",
+                        default="_site",
+                        help="directory with the built site")
+    fingerprint_site(parser.parse_args().site_dir)
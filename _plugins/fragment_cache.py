@@ -0,0 +1,147 @@
+"""Persistent cache of rendered page fragments."""
+
+import hashlib
+import json
+import os
+from typing import Any, Callable, Iterable, Optional
+
+from checkpoint import write_json_atomic
+
+FRAGMENT_CACHE = ".cache/fragments.json"
+
+# modules that contain the templates and formatting functions of all
+# cached fragments (relative to this file)
+TEMPLATE_MODULES = ["common_functions.py", "cantorey.py"]
+
+
+def get_template_version(modules: Iterable[str] = TEMPLATE_MODULES) -> str:
+    """Returns a version that changes whenever a template module changes.
+
+    Args:
+        modules (Iterable[str]): file names of the template modules
+
+    Returns:
+        str: hash of the module sources
+    """
+    digest = hashlib.sha256()
+    plugin_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        with open(os.path.join(plugin_dir, module), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class FragmentCache:
+    """Stores rendered fragments across runs.
+
+    Each fragment is keyed by a hash of its kind, the template version
+    and its normalized input record, so that changed inputs as well as
+    changed templates are rendered again. Entries that were not used in
+    a run are dropped when the cache is saved with pruning.
+    """
+
+    def __init__(self,
+                 file: str = FRAGMENT_CACHE,
+                 version: Optional[str] = None) -> None:
+        """Initializes the cache.
+
+        Args:
+            file (str): JSON file with the cached fragments
+            version (Optional[str]): template version (default: hash of
+              the template modules)
+        """
+        self.file = file
+        self.version = (version if version is not None
+                        else get_template_version())
+        self.fragments: dict[str, Any] = {}
+        self.used: set[str] = set()
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+        if os.path.exists(file):
+            with open(file, encoding="utf-8") as f:
+                self.fragments = json.load(f)["fragments"]
+
+    def make_key(self, kind: str, record: Any) -> str:
+        """Returns the key of a fragment.
+
+        Args:
+            kind (str): kind of the fragment
+            record (Any): JSON-serializable input of the fragment
+
+        Returns:
+            str: hash of kind, template version and normalized record
+        """
+        normalized = json.dumps(record,
+                                ensure_ascii=False,
+                                sort_keys=True,
+                                separators=(",", ":"))
+        return hashlib.sha256(
+            f"{kind}\n{self.version}\n{normalized}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, kind: str, record: Any, render: Callable[[], Any]) -> Any:
+        """Returns a cached fragment, or renders and caches it.
+
+        Args:
+            kind (str): kind of the fragment
+            record (Any): JSON-serializable input of the fragment
+            render (Callable[[], Any]): renders the fragment from the record
+              (must return a JSON-serializable value)
+
+        Returns:
+            Any: the fragment
+        """
+        key = self.make_key(kind, record)
+        try:
+            fragment = self.fragments[key]
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+        except KeyError:
+            fragment = render()
+            self.fragments[key] = fragment
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+        self.used.add(key)
+        return fragment
+
+    def save(self, prune: bool = True) -> None:
+        """Writes the cache.
+
+        Args:
+            prune (bool): whether to drop fragments not used in this run
+              (disable for runs that only render some pages)
+        """
+        if prune:
+            self.fragments = {k: v for k, v in self.fragments.items()
+                              if k in self.used}
+        write_json_atomic({"fragments": self.fragments}, self.file)
+
+    def summary(self) -> str:
+        """Returns the hit rate of each kind of fragment."""
+        lines = ["Fragment cache:"]
+        for kind in sorted(self.hits.keys() | self.misses.keys()):
+            hits = self.hits.get(kind, 0)
+            misses = self.misses.get(kind, 0)
+            lines.append(f"  -> {kind}: {hits} hits, {misses} misses "
+                         f"({100 * hits / (hits + misses):.1f} % hit rate)")
+        return "\n".join(lines)
+
+
+def get_fragment(cache: Optional[FragmentCache],
+                 kind: str,
+                 record: Any,
+                 render: Callable[[], Any]) -> Any:
+    """Returns a fragment from an optional cache.
+
+    Args:
+        cache (Optional[FragmentCache]): fragment cache (None to always
+          render)
+        kind (str): kind of the fragment
+        record (Any): JSON-serializable input of the fragment
+        render (Callable[[], Any]): renders the fragment from the record
+
+    Returns:
+        Any: the fragment
+    """
+    if cache is None:
+        return render()
+    return cache.get(kind, record, render)
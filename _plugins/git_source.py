@@ -0,0 +1,176 @@
+"""Local bare mirrors of score repos as a data source for git objects."""
+
+from datetime import datetime, timezone
+import os
+import shutil
+import tempfile
+from typing import Optional, Union
+
+from git import Git, GitCommandError, Repo
+
+from resilience import ResilientCaller
+
+MIRROR_DIR = ".cache/mirrors"
+
+MIRROR_URL = "https://github.com/{org}/{repo}.git"
+
+# time after which a git clone or fetch is killed (in seconds)
+GIT_TIMEOUT = 300
+
+# committer date of the tagged commit (peeled for annotated tags)
+TAG_FORMAT = ("%(refname:strip=2)\t"
+              "%(committerdate:unix)\t"
+              "%(*committerdate:unix)")
+
+
+def format_timestamp(timestamp: Union[int, str]) -> str:
+    """Formats a unix timestamp as UTC date in ISO 8601 format."""
+    return (datetime.fromtimestamp(int(timestamp), timezone.utc)
+                    .strftime("%Y-%m-%d"))
+
+
+def clone_tag(url: str,
+              tag: str,
+              repo_dir: str,
+              timeout: float = GIT_TIMEOUT) -> Repo:
+    """Clones a single tag of a repo without history.
+
+    Leftovers of a failed attempt in the target directory are removed
+    first, so that the clone can be retried.
+
+    Args:
+        url (str): URL of the repo
+        tag (str): tag to clone
+        repo_dir (str): existing target directory
+        timeout (float): time after which git is killed (in seconds)
+
+    Returns:
+        Repo: the clone
+    """
+    for entry in os.listdir(repo_dir):
+        path = os.path.join(repo_dir, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    Git().clone("--depth", "1", "--branch", tag, url, repo_dir,
+                kill_after_timeout=timeout)
+    return Repo(repo_dir)
+
+
+class GitMirrors:
+    """Reads tag dates and files from bare mirrors of score repos.
+
+    Mirrors are created on first use and fetched again whenever a repo is
+    harvested, so that only new objects are transferred. Everything that
+    is stored in git (tag dates and files at a given ref) is read locally
+    instead of via the GitHub API. Clones and fetches are killed after a
+    timeout and retried after transient errors.
+    """
+
+    def __init__(self,
+                 org: str,
+                 mirror_dir: str = MIRROR_DIR,
+                 url_template: str = MIRROR_URL,
+                 caller: Optional[ResilientCaller] = None) -> None:
+        """Initializes the mirrors.
+
+        Args:
+            org (str): name of the GitHub organization
+            mirror_dir (str): directory with the bare mirrors
+            url_template (str): URL of a repo, with placeholders for
+              organization and repo name (use a file:// URL for local repos)
+            caller (Optional[ResilientCaller]): caller for git operations
+              (default: new caller)
+        """
+        self.org = org
+        self.mirror_dir = mirror_dir
+        self.url_template = url_template
+        self.caller = caller if caller is not None else ResilientCaller()
+
+    def _fetch(self, path: str) -> None:
+        """Fetches new objects into a mirror."""
+        Repo(path).git.fetch("--prune", "--prune-tags", "--force", "origin",
+                             kill_after_timeout=GIT_TIMEOUT)
+
+    def _clone(self, url: str, path: str) -> None:
+        """Creates a mirror via a temporary directory."""
+        tmp_path = tempfile.mkdtemp(dir=self.mirror_dir, suffix=".tmp")
+        try:
+            Git().clone("--bare", url, tmp_path,
+                        kill_after_timeout=GIT_TIMEOUT)
+            mirror = Repo(tmp_path)
+            mirror.git.config("remote.origin.fetch",
+                              "+refs/heads/*:refs/heads/*")
+            mirror.git.config("--add",
+                              "remote.origin.fetch",
+                              "+refs/tags/*:refs/tags/*")
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def update(self, repo_name: str) -> Repo:
+        """Creates or fetches the mirror of a repo.
+
+        New mirrors are cloned into a temporary directory first, so that
+        interrupted clones do not leave broken mirrors behind.
+
+        Args:
+            repo_name (str): name of the repo
+
+        Returns:
+            Repo: the bare mirror
+        """
+        path = f"{self.mirror_dir}/{repo_name}.git"
+        url = self.url_template.format(org=self.org, repo=repo_name)
+
+        if os.path.isdir(path):
+            self.caller.call("git_fetch",
+                             self._fetch,
+                             path,
+                             deadline=GIT_TIMEOUT + 10)
+        else:
+            os.makedirs(self.mirror_dir, exist_ok=True)
+            self.caller.call("git_clone_mirror",
+                             self._clone,
+                             url,
+                             path,
+                             deadline=GIT_TIMEOUT + 10)
+        return Repo(path)
+
+    @staticmethod
+    def get_tag_dates(mirror: Repo) -> dict[str, str]:
+        """Returns the dates of all tags of a mirror.
+
+        Args:
+            mirror (Repo): bare mirror
+
+        Returns:
+            dict[str, str]: date (ISO 8601) of the tagged commit for each tag
+        """
+        tag_dates = {}
+        refs = mirror.git.for_each_ref("refs/tags", format=TAG_FORMAT)
+        for line in refs.splitlines():
+            name, date, peeled_date = line.split("\t")
+            tag_dates[name] = format_timestamp(peeled_date or date)
+        return tag_dates
+
+    @staticmethod
+    def read_file(mirror: Repo, ref: str, path: str) -> Optional[str]:
+        """Reads a file at a given ref of a mirror.
+
+        Args:
+            mirror (Repo): bare mirror
+            ref (str): tag, branch or commit
+            path (str): path of the file in the repo
+
+        Returns:
+            Optional[str]: content of the file, or None if it does not exist
+        """
+        try:
+            return mirror.git.cat_file("blob",
+                                       f"{ref}:{path}",
+                                       strip_newline_in_stdout=False)
+        except GitCommandError:
+            return None
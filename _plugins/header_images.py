@@ -0,0 +1,189 @@
+"""Responsive derivatives of header images."""
+
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import hashlib
+import json
+import os
+
+import strictyaml  # type: ignore
+
+from checkpoint import write_json_atomic
+
+try:
+    from PIL import Image, features
+    HAS_PILLOW = True
+except ModuleNotFoundError:
+    HAS_PILLOW = False
+
+IMAGE_DIR = "assets/images"
+
+DERIVED_DIR = "assets/images/derived"
+
+HEADER_IMAGES = "_data/header_images.yml"
+
+IMAGE_CACHE = ".cache/header_images.json"
+
+# widths of the derivatives (narrower images are not upscaled)
+WIDTHS = [480, 960, 1440, 1920, 2560]
+
+# formats in order of preference, with encoder settings
+FORMATS = {
+    "avif": {"mime_type": "image/avif", "quality": 50},
+    "webp": {"mime_type": "image/webp", "quality": 75, "method": 6},
+    "jpg": {"mime_type": "image/jpeg", "quality": 80,
+            "optimize": True, "progressive": True}
+}
+
+
+def get_formats() -> dict[str, dict]:
+    """Returns the formats supported by the installed Pillow.
+
+    JPEG is always supported, WebP and AVIF depend on the libraries
+    Pillow was built with.
+
+    Returns:
+        dict[str, dict]: encoder settings for each file extension
+    """
+    return {ext: settings for ext, settings in FORMATS.items()
+            if ext == "jpg" or features.check(ext)}
+
+
+def get_file_hash(file: str) -> str:
+    """Returns the SHA-256 of a file."""
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def make_derivatives(file: str, digest: str, out_dir: str) -> dict:
+    """Writes resized copies of an image in all supported formats.
+
+    File names contain the beginning of the source hash, so that
+    derivatives of changed images get new URLs.
+
+    Args:
+        file (str): source image
+        digest (str): SHA-256 of the source image
+        out_dir (str): output directory
+
+    Returns:
+        dict: size, fallback image and sources (one per format, with a
+          srcset of all widths)
+    """
+    name = os.path.splitext(os.path.basename(file))[0]
+    with Image.open(file) as source:
+        im = source.convert("RGB")
+        width, height = im.size
+        widths = sorted({min(w, width) for w in WIDTHS})
+
+        sources = []
+        for ext, settings in get_formats().items():
+            settings = dict(settings)
+            mime_type = settings.pop("mime_type")
+            srcset = []
+            for w in widths:
+                url = f"/{out_dir}/{name}-{digest[:8]}-{w}.{ext}"
+                if not os.path.exists(url[1:]):
+                    resized = im.resize((w, round(height * w / width)),
+                                        Image.Resampling.LANCZOS)
+                    resized.save(url[1:], **settings)
+                srcset.append(f"{url} {w}w")
+            sources.append({"type": mime_type, "srcset": ", ".join(srcset)})
+
+    return {"width": str(widths[-1]),
+            "height": str(round(height * widths[-1] / width)),
+            "fallback": f"/{out_dir}/{name}-{digest[:8]}-{widths[-1]}.jpg",
+            "sources": sources}
+
+
+def generate_header_images(image_dir: str = IMAGE_DIR,
+                           out_dir: str = DERIVED_DIR,
+                           data_file: str = HEADER_IMAGES,
+                           cache_file: str = IMAGE_CACHE) -> None:
+    """Creates derivatives of all header images and saves their srcsets.
+
+    Derivatives are cached by the hash of the source image, so only new
+    or changed images are processed. The srcsets are saved as Jekyll data
+    (keyed by the URL of the source image), from which the page hero
+    include renders a `<picture>` element.
+
+    Args:
+        image_dir (str): directory with header images
+        out_dir (str): output directory of the derivatives
+        data_file (str): YAML file with the srcsets
+        cache_file (str): JSON file with the cached srcsets
+    """
+    if not HAS_PILLOW:
+        print("Pillow is not installed, using full-size header images")
+        return
+
+    cache: dict[str, dict] = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, encoding="utf-8") as f:
+            cache = json.load(f)
+
+    formats = sorted(get_formats())
+    files = sorted(glob.glob(f"{image_dir}/header_*.jpg")
+                   + glob.glob(f"{image_dir}/header_*.png"))
+    digests = {file: get_file_hash(file) for file in files}
+    to_process = [
+        file for file in files
+        if cache.get(file, {}).get("hash") != digests[file]
+        or cache[file]["formats"] != formats
+        or not all(os.path.exists(s.split()[0][1:])
+                   for source in cache[file]["entry"]["sources"]
+                   for s in source["srcset"].split(", "))
+    ]
+    print(f"Creating header image derivatives for {len(to_process)} images "
+          f"({len(files) - len(to_process)} cached)")
+
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor() as executor:
+        entries = executor.map(make_derivatives,
+                               to_process,
+                               [digests[f] for f in to_process],
+                               [out_dir] * len(to_process))
+        for file, entry in zip(to_process, entries):
+            cache[file] = {"hash": digests[file],
+                           "formats": formats,
+                           "entry": entry}
+
+    # remove derivatives of images that changed or no longer exist
+    cache = {file: cache[file] for file in files}
+    used = {os.path.basename(s.split()[0])
+            for c in cache.values()
+            for source in c["entry"]["sources"]
+            for s in source["srcset"].split(", ")}
+    for derived_file in os.listdir(out_dir):
+        if derived_file not in used:
+            os.remove(os.path.join(out_dir, derived_file))
+
+    write_json_atomic(cache, cache_file)
+    with open(data_file, "w", encoding="utf-8") as f:
+        f.write(strictyaml.as_document(
+            {f"/{file}": c["entry"] for file, c in cache.items()}
+        ).as_yaml())
+
+
+def format_header_image(image: str, data_file: str = HEADER_IMAGES) -> str:
+    """Formats the header front matter of a page.
+
+    If derivatives of the header image exist, their srcsets are added,
+    so that pages do not depend on the Jekyll data file.
+
+    Args:
+        image (str): file name of the header image
+        data_file (str): YAML file with the srcsets
+
+    Returns:
+        str: YAML front matter
+    """
+    header = {"image": f"/{IMAGE_DIR}/{image}"}
+    if os.path.exists(data_file):
+        with open(data_file, encoding="utf-8") as f:
+            header_images = strictyaml.load(f.read()).data
+        try:
+            header.update(header_images[header["image"]])
+        except KeyError:
+            pass
+    return strictyaml.as_document({"header": header}).as_yaml().rstrip("\n")
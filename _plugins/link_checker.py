@@ -0,0 +1,216 @@
+"""Verification of generated asset links."""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+import threading
+import time
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from checkpoint import write_json_atomic
+
+LINK_CACHE = ".cache/links.json"
+
+LINK_REPORT = ".cache/link_report.json"
+
+
+def collect_asset_urls(works: dict, collection_works: dict) -> set[str]:
+    """Collects the asset URLs of all works.
+
+    Args:
+        works (dict): works metadata
+        collection_works (dict): works metadata from collection repos
+
+    Returns:
+        set[str]: asset URLs
+    """
+    all_works = ([w for ws in works.values() for w in ws]
+                 + [w for ws in collection_works.values() for w in ws])
+    return {url for w in all_works for url in w["asset_urls"].values()}
+
+
+class LinkChecker:
+    """Checks URLs with concurrent HEAD requests over persistent connections.
+
+    Each worker thread keeps one connection per host. Results of working
+    links are cached on disk and only checked again after the TTL has
+    expired; broken links are checked in every run.
+    """
+
+    def __init__(self,
+                 cache_file: str = LINK_CACHE,
+                 ttl: float = 7 * 24 * 3600,
+                 max_workers: int = 16,
+                 timeout: float = 10) -> None:
+        """Initializes the checker.
+
+        Args:
+            cache_file (str): JSON file with cached results
+            ttl (float): time (in seconds) after which links are checked
+              again
+            max_workers (int): number of concurrent requests
+            timeout (float): timeout of a single request (in seconds)
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._local = threading.local()
+
+        self.cache: dict[str, dict] = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def _get_connection(self,
+                        scheme: str,
+                        host: str) -> http.client.HTTPConnection:
+        """Returns the connection of the current thread to a host."""
+        connections = self._local.__dict__.setdefault("connections", {})
+        if (scheme, host) not in connections:
+            if scheme == "https":
+                connections[(scheme, host)] = http.client.HTTPSConnection(
+                    host, timeout=self.timeout
+                )
+            else:
+                connections[(scheme, host)] = http.client.HTTPConnection(
+                    host, timeout=self.timeout
+                )
+        return connections[(scheme, host)]
+
+    def _request(self, url: str, method: str) -> int:
+        """Sends a request and returns the status code.
+
+        Args:
+            url (str): URL to check
+            method (str): HTTP method
+
+        Returns:
+            int: HTTP status code
+        """
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        headers = {"Range": "bytes=0-0"} if method == "GET" else {}
+        conn = self._get_connection(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.getheader("connection", "").lower() == "close":
+                conn.close()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+
+    def _check(self, url: str) -> dict:
+        """Checks a single URL.
+
+        Redirects count as working links, since GitHub redirects release
+        downloads to its storage backend. Servers that do not support
+        HEAD requests are asked for the first byte instead. After a
+        connection error, the request is repeated once with a new
+        connection (the server may have closed an idle connection).
+
+        Args:
+            url (str): URL to check
+
+        Returns:
+            dict: status code (0 for connection errors) and check time
+        """
+        status = 0
+        error = None
+        for _ in range(2):
+            try:
+                status = self._request(url, "HEAD")
+                if status in (405, 501):
+                    status = self._request(url, "GET")
+                error = None
+                break
+            except (OSError, http.client.HTTPException) as e:
+                error = str(e) or type(e).__name__
+
+        return {"status": status,
+                "ok": 200 <= status < 400,
+                "error": error,
+                "checked": time.time()}
+
+    def is_cached(self, url: str) -> bool:
+        """Checks whether a URL has a cached result that is still valid."""
+        entry = self.cache.get(url)
+        return (entry is not None
+                and entry["ok"]
+                and time.time() - entry["checked"] < self.ttl)
+
+    def check(self, urls: Iterable[str]) -> dict[str, dict]:
+        """Checks URLs that have no valid cached result.
+
+        Args:
+            urls (Iterable[str]): URLs to check
+
+        Returns:
+            dict[str, dict]: result for each URL
+        """
+        urls = sorted(set(urls))
+        to_check = [url for url in urls if not self.is_cached(url)]
+        print(f"Checking {len(to_check)} links "
+              f"({len(urls) - len(to_check)} cached)")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for url, result in zip(to_check,
+                                   executor.map(self._check, to_check)):
+                self.cache[url] = result
+        print(f"  -> finished in {time.perf_counter() - start:.1f} s")
+
+        write_json_atomic(self.cache, self.cache_file)
+        return {url: self.cache[url] for url in urls}
+
+
+def verify_links(urls: Iterable[str],
+                 report_file: str = LINK_REPORT,
+                 checker: Optional[LinkChecker] = None) -> list[str]:
+    """Checks URLs and writes a report of the broken ones.
+
+    Args:
+        urls (Iterable[str]): URLs to check
+        report_file (str): JSON file with broken links
+        checker (Optional[LinkChecker]): checker (default: cached checker)
+
+    Returns:
+        list[str]: broken URLs
+    """
+    if checker is None:
+        checker = LinkChecker()
+    results = checker.check(urls)
+
+    broken = {url: r for url, r in results.items() if not r["ok"]}
+    for url, r in broken.items():
+        print(f"  -> broken link ({r['error'] or r['status']}): {url}")
+    print(f"{len(broken)} of {len(results)} links are broken")
+
+    write_json_atomic(
+        {url: {"status": r["status"], "error": r["error"]}
+         for url, r in broken.items()},
+        report_file
+    )
+    return list(broken)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("urls",
+                        nargs="+",
+                        help="URLs to check")
+    parser.add_argument("--cache",
+                        default=LINK_CACHE,
+                        help="JSON file with cached results")
+    parser.add_argument("--ttl",
+                        type=float,
+                        default=7 * 24 * 3600,
+                        help="time (in seconds) until links are checked again")
+    args = parser.parse_args()
+    verify_links(args.urls, checker=LinkChecker(args.cache, args.ttl))
@@ -1,26 +1,51 @@
 """Prepare score and project pages from metadata in GitHub score repos."""
 
-from operator import attrgetter, itemgetter
+import argparse
+from concurrent.futures import Future
+from html import escape
+import json
+from operator import attrgetter
 import os
 import re
 from typing import Optional, Iterable
+import zlib
 
 from github import Github
 from github.Organization import Organization
+from github.Repository import Repository
 from github.GithubException import UnknownObjectException
+import pandas as pd
 from pygments import highlight
 from pygments.lexers.lilypond import LilyPondLexer
 from pygments.formatters.html import HtmlFormatter
 import strictyaml  # type: ignore
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper  # type: ignore
 
 from common_functions import (Composer,
                               format_metadata,
+                              get_composer_names,
                               get_work_list,
                               get_collection_works,
                               get_tag_date,
-                              parse_composer_details,
-                              slugify)
+                              parse_composer_details)
 from cantorey import add_cantorey
+from catalogue import write_catalogue
+from checkpoint import HarvestCheckpoint, write_json_atomic
+from facets import write_facets
+from fragment_cache import FRAGMENT_CACHE, FragmentCache
+from git_source import MIRROR_DIR, GitMirrors
+from header_images import format_header_image, generate_header_images
+from link_checker import LINK_REPORT, collect_asset_urls, verify_links
+from resilience import REQUEST_TIMEOUT
+from scheduler import PRIORITY_HIGH, PRIORITY_LOW, RequestScheduler
+from works_table import (build_works_table,
+                         get_composer_slices,
+                         write_statistics)
 
 try:
     from pat import TOKEN
@@ -28,6 +53,34 @@ except ModuleNotFoundError:
     TOKEN = os.environ["GH_API_TOKEN"]
 
 
+HARVEST_CHECKPOINT = ".cache/harvest.json"
+
+SHARD_DIR = "_shards"
+
+PREFACE_URL = "https://edition.esser-skala.at/assets/pdf/{repo}/{file}"
+
+IGNORED_REPOS = [
+    ".github",
+    "ees-template",
+    "ees-tools",
+    "eybler-sacred-music",
+    "haydn-m-proprium-missae",
+    "imslp-lists",
+    "misc-analyses",
+    "sacral-lyrics",
+    "tuma-catalogue-of-works",
+    "tuma-collected-works",
+    "webpage",
+    "werner-catalogue-of-works",
+    "werner-collected-works"
+]
+
+# composers whose works are only available in collection repos
+COLLECTION_COMPOSERS = [
+    Composer("Gregor Joseph", "Werner"),
+    Composer("František Ignác Antonín", "Tůma")
+]
+
 NAVIGATION_TEMPLATE = """\
 main:
   - title: Welcome
@@ -54,13 +107,36 @@ about:
         url: /about/technical-documentation
 
 scores:
-{}
-- title: ❦ Bonus
-  children:
-    - title: Cantorey Performance Materials
-      url: /scores/cantorey-performance-materials
+{}"""
+
+# entries of the scores navigation after the composers
+SCORES_NAVIGATION_EXTRA = [
+    {"title": "❦ Bonus",
+     "children": [{"title": "Cantorey Performance Materials",
+                   "url": "/scores/cantorey-performance-materials"}]}
+]
+
+# pre-rendered scores navigation (markup of the theme's nav_list include)
+NAV_LIST_TEMPLATE = """\
+<nav class="nav__list nav__list--prerendered">
+  <input id="ac-toc" name="accordion-toc" type="checkbox" />
+  <label for="ac-toc">{{{{ site.data.ui-text[site.locale].menu_label | default: "Toggle Menu" }}}}</label>
+  <ul class="nav__items">
+{items}
+  </ul>
+</nav>
 """
 
+NAV_ITEM_TEMPLATE = """\
+    <li>
+      <span class="nav__sub-title">{title}</span>
+      <ul>
+{children}
+      </ul>
+    </li>"""
+
+NAV_CHILD_TEMPLATE = '        <li><a href="{url}">{title}</a></li>'
+
 PAGE_TEMPLATE = """\
 ---
 title: {title}
@@ -78,10 +154,7 @@ sidebar:
 
 {preface}
 
-|ID|Title|Genre|
-|--|-----|-----|
-{table_rows}
-{{: id="toctable" class="overview-table"}}
+{table}
 
 
 ## Works
@@ -89,8 +162,28 @@ sidebar:
 {work_details}
 """
 
+# work links in table rows (markdown or HTML)
+TABLEROW_ANCHOR = re.compile(r'\]\(#work-([^)]+)\)|<a href="#work-([^"]+)">')
+
+TOCTABLE_TEMPLATE = """\
+|ID|Title|Genre|
+|--|-----|-----|
+{table_rows}
+{{: id="toctable" class="overview-table"}}"""
+
+TOCTABLE_TEMPLATE_HTML = """\
+<table id="toctable" class="overview-table">
+<thead>
+<tr><th>ID</th><th>Title</th><th>Genre</th></tr>
+</thead>
+<tbody>
+{table_rows}
+</tbody>
+</table>"""
+
 
 def get_markdown_file(gh_org: Organization,
+                      scheduler: RequestScheduler,
                       repo_file: str,
                       out_file: str,
                       title: str) -> None:
@@ -98,6 +191,7 @@ def get_markdown_file(gh_org: Organization,
 
     Args:
         gh_org (Organization): GitHub organization
+        scheduler (RequestScheduler): scheduler for GitHub requests
         repo_file (str): file name in repository
         out_file (str): file name for Jekyll
         title (str): page title
@@ -115,9 +209,10 @@ def get_markdown_file(gh_org: Organization,
     )
 
     print(f"Obtaining {repo_file}")
-    doc = (gh_org  # type: ignore
-           .get_repo("ees-tools")
-           .get_contents(repo_file)
+    doc = (scheduler.call("markdown_file",
+                          lambda: gh_org  # type: ignore
+                          .get_repo("ees-tools")
+                          .get_contents(repo_file))
            .decoded_content
            .decode("utf-8")
            .split("\n", 1)[1])
@@ -153,26 +248,160 @@ def highlight_lilypond_snippets(file: str) -> None:
         f.write(doc)
 
 
+def harvest_repo(repo: Repository,
+                 scheduler: RequestScheduler,
+                 checkpoint: HarvestCheckpoint,
+                 counter_str: str,
+                 mirrors: Optional[GitMirrors] = None) -> Optional[dict]:
+    """Collects the unformatted work metadata of a score repo.
+
+    If the checkpoint contains a valid entry for the current version of
+    the repo (which includes its latest release), this entry is returned
+    instead.
+
+    If mirrors are given, tag dates and files are read from the local
+    mirror of the repo, and only the releases and their assets are
+    requested via the API. Otherwise, the tag date of the latest release
+    is requested with high priority, the dates of older releases with low
+    priority. Both are returned as futures that are available after the
+    scheduler has run. The metadata is added to the checkpoint once all
+    dates are available.
+
+    Args:
+        repo (Repository): score repository
+        scheduler (RequestScheduler): scheduler for GitHub requests
+        checkpoint (HarvestCheckpoint): checkpoint of harvested repos
+        counter_str (str): progress indicator
+        mirrors (Optional[GitMirrors]): local mirrors of the score repos
+
+    Returns:
+        Optional[dict]: work metadata, or None if the repo is ignored
+    """
+    releases = scheduler.call("get_releases",
+                              lambda: list(repo.get_releases()))
+    valid, cached_metadata = checkpoint.get(repo, releases)
+    if valid:
+        print(f"{counter_str} Resuming {repo.name}")
+        return cached_metadata
+
+    if not releases:
+        print(f"{counter_str} Ignoring {repo.name} (no releases)")
+        checkpoint.save(repo, releases, None)
+        return None
+
+    print(f"{counter_str} Analyzing {repo.name}")
+    if mirrors is not None:
+        mirror = mirrors.update(repo.name)
+        metadata_file = mirrors.read_file(mirror,
+                                          releases[0].tag_name,
+                                          "metadata.yaml")
+        printer_file = mirrors.read_file(mirror,
+                                         repo.default_branch,
+                                         "print/printer.yaml")
+        tag_dates = mirrors.get_tag_dates(mirror)
+    else:
+        try:
+            metadata_file = (
+                scheduler.call("get_contents",
+                               repo.get_contents,
+                               "metadata.yaml",
+                               ref=releases[0].tag_name,
+                               hedged=True)
+                .decoded_content
+                .decode("utf-8")
+            )
+        except UnknownObjectException:
+            metadata_file = None
+
+    if metadata_file is None:
+        print(f"UnknownObjectException for {repo.name}")
+        checkpoint.save(repo, releases, None)
+        return None
+
+    metadata = strictyaml.load(metadata_file).data
+    metadata["repo"] = repo.name
+
+    if mirrors is not None:
+        metadata["releases"] = [
+            {"version": r.tag_name, "date": tag_dates[r.tag_name]}
+            for r in releases
+        ]
+    else:
+        tags = {t.name: t
+                for t in scheduler.call("get_tags",
+                                        lambda: list(repo.get_tags()))}
+        metadata["releases"] = [
+            {"version": r.tag_name,
+             "date": scheduler.submit(
+                 "get_tag_date",
+                 get_tag_date,
+                 tags[r.tag_name],
+                 priority=PRIORITY_HIGH if counter == 0 else PRIORITY_LOW,
+                 hedged=True
+             )}
+            for counter, r in enumerate(releases)
+        ]
+
+    metadata["assets"] = [
+        i.name for i in scheduler.call("get_assets",
+                                       lambda: list(releases[0].get_assets()))
+    ]
+
+    if mirrors is None:
+        try:
+            printer_file = (
+                scheduler.call("get_contents",
+                               repo.get_contents,
+                               "print/printer.yaml",
+                               hedged=True)
+                .decoded_content
+                .decode("utf-8")
+            )
+        except UnknownObjectException:
+            printer_file = None
+    if printer_file is not None:
+        metadata["asin"] = strictyaml.load(printer_file).data["asin"]
+
+    if mirrors is not None:
+        checkpoint.save(repo, releases, metadata)
+    else:
+        checkpoint.save_when_done(repo, releases, metadata)
+    return metadata
+
+
 def collect_metadata(gh_org: Organization,
-                     ignored_repos: Optional[Iterable[str]]=None) -> dict:
+                     scheduler: RequestScheduler,
+                     checkpoint: HarvestCheckpoint,
+                     ignored_repos: Optional[Iterable[str]]=None,
+                     shard: Optional[tuple[int, int]]=None,
+                     mirrors: Optional[GitMirrors]=None) -> dict:
     """Collects work metadata from YAML files in GitHub repos.
 
+    Repos with a valid entry in the checkpoint are not harvested again.
+
     Args:
         gh_org (Organization): GitHub organization
+        scheduler (RequestScheduler): scheduler for GitHub requests
+        checkpoint (HarvestCheckpoint): checkpoint of harvested repos
         ignored_repos (Optional[Iterable[str]]): list of ignored repositories
+        shard (Optional[tuple[int, int]]): only harvest repos in this shard
+        mirrors (Optional[GitMirrors]): local mirrors of the score repos
 
     Returns:
         dict: work metadata
     """
 
-    repos = gh_org.get_repos()
+    repos = scheduler.call("get_repos", lambda: list(gh_org.get_repos()))
     if ignored_repos is None:
         ignored_repos = []
+    checkpoint.prune({repo.name for repo in repos})
 
-    works: dict[Composer, list] = {}
-
+    harvested: list[Future] = []
     for counter, repo in enumerate(repos):
-        counter_str = f"({counter + 1}/{repos.totalCount})"
+        counter_str = f"({counter + 1}/{len(repos)})"
+
+        if not in_shard(repo.name, shard):
+            continue
 
         if repo.name in ignored_repos:
             print(f"{counter_str} Ignoring {repo.name} (blacklisted)")
@@ -182,46 +411,47 @@ def collect_metadata(gh_org: Organization,
             print(f"{counter_str} Ignoring {repo.name} (private)")
             continue
 
-        releases = repo.get_releases()
-        if releases.totalCount == 0:
-            print(f"{counter_str} Ignoring {repo.name} (no releases)")
-            continue
+        harvested.append(
+            scheduler.submit("harvest_repo",
+                             harvest_repo,
+                             repo,
+                             scheduler,
+                             checkpoint,
+                             counter_str,
+                             mirrors,
+                             paced=False)
+        )
 
-        print(f"{counter_str} Analyzing {repo.name}")
-        try:
-            metadata = strictyaml.load(
-                repo  # type: ignore
-                .get_contents("metadata.yaml", ref=releases[0].tag_name)
-                .decoded_content
-                .decode("utf-8")
-            ).data
-        except UnknownObjectException:
-            print(f"UnknownObjectException for {repo.name}")
+    scheduler.run()
+
+    harvested_metadata = []
+    for future in harvested:
+        metadata = future.result()
+        if metadata is None:
             continue
 
-        metadata["repo"] = repo.name
-        tags = {t.name: t for t in repo.get_tags()}
+        for release in metadata["releases"]:
+            if isinstance(release["date"], Future):
+                release["date"] = release["date"].result()
+        harvested_metadata.append(metadata)
 
-        metadata["releases"] = [
-            {"version": r.tag_name,
-             "date": get_tag_date(tags[r.tag_name])}  # type: ignore
-            for r in releases
-        ]
+    return group_works(harvested_metadata, gh_org.login)
 
-        metadata["assets"] = [i.name for i in releases[0].get_assets()]
 
-        try:
-            print_data = strictyaml.load(
-                repo  # type: ignore
-                .get_contents("print/printer.yaml")
-                .decoded_content
-                .decode("utf-8")
-            ).data
-            metadata["asin"] = print_data["asin"]
-        except UnknownObjectException:
-            pass
+def group_works(harvested_metadata: Iterable[dict],
+                gh_org_name: str) -> dict:
+    """Formats harvested metadata and groups it by composer.
 
-        metadata = format_metadata(metadata, gh_org.login)
+    Args:
+        harvested_metadata (Iterable[dict]): unformatted work metadata
+        gh_org_name (str): name of GitHub organization
+
+    Returns:
+        dict: work metadata
+    """
+    works: dict[Composer, list] = {}
+    for metadata in harvested_metadata:
+        metadata = format_metadata(metadata, gh_org_name)
 
         c = Composer(**metadata["composer"])
         try:
@@ -229,161 +459,622 @@ def collect_metadata(gh_org: Organization,
         except KeyError:
             works[c] = [metadata]
 
+    for c in COLLECTION_COMPOSERS:
+        works.setdefault(c, [])
+
     return works
 
 
-def generate_score_pages(works: dict,
-                         gh_org: Organization,
-                         page_settings_file: str) -> None:
-    """Generates one markdown file for each composer.
+def load_page_settings(page_settings_file: str) -> dict:
+    """Loads the optional page settings.
 
     Args:
-        works (dict): works metadata
-        gh_org (github.Organization): GitHub organization
         page_settings_file (str): YAML file with optional page settings
+
+    Returns:
+        dict: page settings for each composer slug
     """
     with open(page_settings_file, encoding="utf-8") as f:
-        page_settings = strictyaml.load(f.read()).data["page_settings"]
+        return strictyaml.load(f.read()).data["page_settings"]
 
-    navigation: dict[str, list] = {}
 
-    for composer in sorted(works.keys(),
-                           key=attrgetter("last", "suffix", "first")):
-        # page header
-        if composer.last == "Anonymus":
-            title = composer.last
-            slug = composer.last
-        elif composer.suffix == "":
-            title = f"{composer.last}, {composer.first}"
-            slug = f"{composer.first}-{composer.last}"
-        else:
-            title = f"{composer.last} {composer.suffix}, {composer.first}"
-            slug = f"{composer.first}-{composer.last}-{composer.suffix}"
+def collect_collection_works(gh_org: Organization,
+                             scheduler: RequestScheduler,
+                             page_settings: dict) -> dict[str, list]:
+    """Collects work metadata from all collection repos.
 
-        slug = slugify(slug)
-        permalink = f"/scores/{slug}/"
-        print("Generating page for", slug)
+    Args:
+        gh_org (Organization): GitHub organization
+        scheduler (RequestScheduler): scheduler for GitHub requests
+        page_settings (dict): page settings for each composer slug
 
-        # header image
-        try:
-            header_image = ("header:\n  image: /assets/images/"
-                            + page_settings[slug]["header_image"])
-        except KeyError:
-            header_image = ""
+    Returns:
+        dict[str, list]: work metadata for each composer slug
+    """
+    collection_works = {}
+    for slug, settings in page_settings.items():
+        if "collection_repo" in settings:
+            collection_works[slug] = get_collection_works(
+                settings["collection_repo"], gh_org, scheduler
+            )
+    return collection_works
 
-        # composer details
-        composer_details = ""
-        details_file = f"_data/composers/{slug}.yml"
-        if os.path.exists(details_file):
-            print("  -> Adding composer details")
-            composer_details = parse_composer_details(details_file)
 
-        # page intro
-        try:
-            page_intro = page_settings[slug]["page_intro"]
-        except KeyError:
-            page_intro = ""
+def write_composer_page(composer: Composer,
+                        table_rows: list[str],
+                        work_details: list[str],
+                        page_settings: dict,
+                        html: bool = False,
+                        cache: Optional[FragmentCache] = None) -> None:
+    """Writes the markdown file for a composer.
 
-        # preface
-        try:
-            repo = page_settings[slug]["collection_repo"]
-            preface_file = page_settings[slug]["preface"]
-            preface = (
-                f"[General preface](https://edition.esser-skala.at/assets/pdf/"
-                f"{repo}/{preface_file})"
+    Args:
+        composer (Composer): the composer
+        table_rows (list[str]): formatted table rows (sorted)
+        work_details (list[str]): formatted work details (sorted)
+        page_settings (dict): page settings for each composer slug
+        html (bool): whether the work tables are HTML instead of markdown
+        cache (Optional[FragmentCache]): cache for the composer details
+    """
+    # page header
+    title, slug = get_composer_names(composer)
+    permalink = f"/scores/{slug}/"
+
+    # header image
+    try:
+        header_image = format_header_image(
+            page_settings[slug]["header_image"]
+        )
+    except KeyError:
+        header_image = ""
+
+    # composer details
+    composer_details = ""
+    details_file = f"_data/composers/{slug}.yml"
+    if os.path.exists(details_file):
+        print("  -> Adding composer details")
+        composer_details = parse_composer_details(details_file, cache)
+
+    # page intro
+    try:
+        page_intro = page_settings[slug]["page_intro"]
+    except KeyError:
+        page_intro = ""
+
+    # preface
+    try:
+        repo = page_settings[slug]["collection_repo"]
+        preface_file = page_settings[slug]["preface"]
+        preface = ("[General preface]("
+                   + PREFACE_URL.format(repo=repo, file=preface_file)
+                   + ")")
+    except KeyError:
+        preface = ""
+
+    # works from individual repos and collection repo
+    toctable = TOCTABLE_TEMPLATE_HTML if html else TOCTABLE_TEMPLATE
+    table = toctable.format(table_rows="\n".join(table_rows))
+
+    # save composer page
+    with open(f"_pages/scores/{slug}.md", "w", encoding="utf-8") as f:
+        f.write(
+            PAGE_TEMPLATE.format(
+                title=title,
+                permalink=permalink,
+                header_image=header_image,
+                composer_details=composer_details,
+                page_intro=page_intro,
+                preface=preface,
+                table=table,
+                work_details="\n".join(work_details)
             )
-        except KeyError:
-            preface = ""
-
-        # works from individual repos
-        table_rows_repos, work_details_repos = get_work_list(
-            sorted(works[composer], key=itemgetter("title")),
         )
 
-        # works from collection repo
-        try:
-            coll_repo = page_settings[slug]["collection_repo"]
-            table_rows_coll, work_details_coll = get_collection_works(
-                coll_repo, gh_org
-            )
-        except KeyError:
-            table_rows_coll = []
-            work_details_coll = []
-
-        # combine table rows and work details
-        table_rows = "\n".join(sorted(table_rows_repos + table_rows_coll))
-        work_details = "\n".join(sorted(work_details_repos + work_details_coll))
-
-        # save composer page
-        with open(f"_pages/scores/{slug}.md", "w", encoding="utf-8") as f:
-            f.write(
-                PAGE_TEMPLATE.format(
-                    title=title,
-                    permalink=permalink,
-                    header_image=header_image,
-                    composer_details=composer_details,
-                    page_intro=page_intro,
-                    preface=preface,
-                    table_rows=table_rows,
-                    work_details=work_details
-                )
+
+def generate_composer_page(composer: Composer,
+                           works: list,
+                           page_settings: dict,
+                           html: bool = False,
+                           cache: Optional[FragmentCache] = None) -> None:
+    """Generates the markdown file for a composer.
+
+    Args:
+        composer (Composer): the composer
+        works (list): works metadata (from individual and collection repos)
+        page_settings (dict): page settings for each composer slug
+        html (bool): whether to emit work tables as HTML instead of markdown
+        cache (Optional[FragmentCache]): cache for rendered fragments
+    """
+    _, slug = get_composer_names(composer)
+    print("Generating page for", slug)
+    table_rows, work_details = get_work_list(works, html=html)
+    write_composer_page(composer,
+                        table_rows,
+                        work_details,
+                        page_settings,
+                        html=html,
+                        cache=cache)
+
+
+def render_navigation(nav_dict: list[dict]) -> str:
+    """Renders a navigation with the markup of the theme's nav_list include.
+
+    Args:
+        nav_dict (list[dict]): entries with title and children
+
+    Returns:
+        str: HTML
+    """
+    items = [
+        NAV_ITEM_TEMPLATE.format(
+            title=escape(item["title"]),
+            children="\n".join(
+                NAV_CHILD_TEMPLATE.format(url=escape(child["url"]),
+                                          title=escape(child["title"]))
+                for child in item["children"]
             )
+        )
+        for item in nav_dict
+    ]
+    return NAV_LIST_TEMPLATE.format(items="\n".join(items))
+
+
+def write_navigation(composers: Iterable[Composer]) -> None:
+    """Writes the navigation with one entry per composer, grouped by initial.
 
-        # add navigation entry
+    The scores navigation is also written as pre-rendered include, so
+    that Jekyll does not need to render it for each page.
+
+    Args:
+        composers (Iterable[Composer]): composers with a page
+    """
+    navigation: dict[str, list] = {}
+
+    for composer in sorted(composers,
+                           key=attrgetter("last", "suffix", "first")):
+        title, slug = get_composer_names(composer)
         last_initial = composer.last[0]
-        composer_nav = {"title": title, "url": permalink}
+        composer_nav = {"title": title, "url": f"/scores/{slug}/"}
         try:
             navigation[last_initial] += [composer_nav]
         except KeyError:
             navigation[last_initial] = [composer_nav]
 
-
-    # save navigation
     nav_dict = [{"title": initial, "children": children}
                 for initial, children in navigation.items()]
+    nav_dict += SCORES_NAVIGATION_EXTRA
 
     with open("_data/navigation.yml", "w", encoding="utf-8") as f:
-        f.write(NAVIGATION_TEMPLATE.format(strictyaml.as_document(nav_dict)
-                                                     .as_yaml()))
+        f.write(NAVIGATION_TEMPLATE.format(yaml.dump(nav_dict,
+                                                     Dumper=SafeDumper,
+                                                     allow_unicode=True,
+                                                     sort_keys=False)))
 
+    with open("_includes/scores_nav.html", "w", encoding="utf-8") as f:
+        f.write(render_navigation(nav_dict))
 
-def main() -> None:
-    """Main workflow."""
-    ignored_repos = [
-        ".github",
-        "ees-template",
-        "ees-tools",
-        "eybler-sacred-music",
-        "haydn-m-proprium-missae",
-        "imslp-lists",
-        "misc-analyses",
-        "sacral-lyrics",
-        "tuma-catalogue-of-works",
-        "tuma-collected-works",
-        "webpage",
-        "werner-catalogue-of-works",
-        "werner-collected-works"
+
+def generate_score_pages(works: dict,
+                         table: pd.DataFrame,
+                         page_settings: dict,
+                         html: bool = False,
+                         cache: Optional[FragmentCache] = None) -> None:
+    """Generates one markdown file for each composer and the navigation.
+
+    Args:
+        works (dict): works metadata (only used for the set of composers)
+        table (pd.DataFrame): works table from `build_works_table`
+        page_settings (dict): page settings for each composer slug
+        html (bool): whether to emit work tables as HTML instead of markdown
+        cache (Optional[FragmentCache]): cache for rendered fragments
+    """
+    slices = get_composer_slices(table)
+    for composer in works:
+        _, slug = get_composer_names(composer)
+        generate_composer_page(composer,
+                               slices.get(slug, []),
+                               page_settings,
+                               html=html,
+                               cache=cache)
+
+    write_navigation(works.keys())
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parses a shard specification.
+
+    Args:
+        shard (str): shard "i/N" (with 1 <= i <= N)
+
+    Raises:
+        ValueError: if the specification is invalid
+
+    Returns:
+        tuple[int, int]: shard index and number of shards
+    """
+    index, count = (int(i) for i in shard.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {shard}")
+    return index, count
+
+
+def in_shard(key: str, shard: Optional[tuple[int, int]]) -> bool:
+    """Checks whether a repo or composer slug belongs to a shard.
+
+    The assignment only depends on the key, so that it is identical in
+    all processes.
+
+    Args:
+        key (str): repo name or composer slug
+        shard (Optional[tuple[int, int]]): shard index and number of shards
+
+    Returns:
+        bool: True if the key belongs to the shard (or if shard is None)
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(key.encode("utf-8")) % count == index - 1
+
+
+def write_shard(works: dict,
+                collection_works: dict,
+                checkpoint: HarvestCheckpoint,
+                shard: tuple[int, int],
+                html: bool = False) -> None:
+    """Writes the partial output of a shard.
+
+    The output contains the works harvested by this shard for each
+    composer and the works of the collection repos assigned to this
+    shard. Pages are rendered by the merge step from the works of all
+    shards, since duplicates and collection works can only be resolved
+    once all works are known.
+
+    Args:
+        works (dict): works metadata
+        collection_works (dict): works metadata from collection repos
+        checkpoint (HarvestCheckpoint): checkpoint of harvested repos
+        shard (tuple[int, int]): shard index and number of shards
+        html (bool): whether to emit work tables as HTML instead of markdown
+    """
+    index, count = shard
+    write_json_atomic(
+        {"shard": [index, count],
+         "html": html,
+         "composers": [{"composer": composer._asdict(),
+                        "works": composer_works}
+                       for composer, composer_works in works.items()],
+         "collections": collection_works,
+         "state": {"repos": checkpoint.repos,
+                   "collections": checkpoint.collections}},
+        f"{SHARD_DIR}/shard-{index}.json"
+    )
+
+
+def check_pages(composers: Iterable[Composer], catalogue_dir: str) -> None:
+    """Checks that each composer page lists the works of its catalogue shard.
+
+    Args:
+        composers (Iterable[Composer]): composers with a page
+        catalogue_dir (str): directory with the catalogue
+
+    Raises:
+        ValueError: if the table rows of a page differ from the catalogue
+    """
+    for composer in composers:
+        _, slug = get_composer_names(composer)
+        try:
+            with open(f"{catalogue_dir}/{slug}.json", encoding="utf-8") as f:
+                records = json.load(f)["works"]
+        except FileNotFoundError:
+            records = []
+
+        with open(f"_pages/scores/{slug}.md", encoding="utf-8") as f:
+            rows = [markdown_slug or html_slug
+                    for markdown_slug, html_slug
+                    in TABLEROW_ANCHOR.findall(f.read())]
+
+        catalogued = [r["id_slug"] for r in records]
+        if sorted(rows) != sorted(catalogued):
+            raise ValueError(
+                f"Page of {slug} does not match the catalogue "
+                f"(only on page: {sorted(set(rows) - set(catalogued))}, "
+                f"only in catalogue: {sorted(set(catalogued) - set(rows))}, "
+                f"{len(rows)} vs. {len(catalogued)} works)"
+            )
+
+
+def merge_shards(page_settings: dict,
+                 cache: Optional[FragmentCache] = None) -> None:
+    """Combines the partial outputs of all shards into the final pages.
+
+    Writes the composer pages, the navigation, the catalogue and the
+    statistics from the works of all shards, and merges the harvest
+    states of the shards.
+
+    Args:
+        page_settings (dict): page settings for each composer slug
+        cache (Optional[FragmentCache]): cache for rendered fragments
+
+    Raises:
+        ValueError: if shards are missing or inconsistent, or if the pages
+          do not match the catalogue
+    """
+    shards = []
+    for file in sorted(os.listdir(SHARD_DIR)):
+        with open(f"{SHARD_DIR}/{file}", encoding="utf-8") as f:
+            shards.append(json.load(f))
+
+    if not shards:
+        raise ValueError(f"No shards found in {SHARD_DIR}")
+    count = shards[0]["shard"][1]
+    html = shards[0]["html"]
+    if sorted(s["shard"][0] for s in shards) != list(range(1, count + 1)):
+        raise ValueError(f"Expected {count} shards in {SHARD_DIR}")
+    if any(s["html"] != html for s in shards):
+        raise ValueError("Shards were generated with different formats")
+
+    works: dict[Composer, list] = {}
+    collection_works = {}
+    state = HarvestCheckpoint(HARVEST_CHECKPOINT)
+
+    for shard in shards:
+        print(f"Merging shard {shard['shard'][0]}/{count}")
+        for entry in shard["composers"]:
+            c = Composer(**entry["composer"])
+            works.setdefault(c, []).extend(entry["works"])
+        collection_works.update(shard["collections"])
+        state.merge(shard["state"]["repos"], shard["state"]["collections"])
+
+    works_table = build_works_table(works, collection_works)
+    generate_score_pages(works,
+                         works_table,
+                         page_settings,
+                         html=html,
+                         cache=cache)
+    write_catalogue(works_table, "assets/catalogue")
+    check_pages(works.keys(), "assets/catalogue")
+    write_statistics(works_table, "assets/catalogue/statistics.json")
+    write_facets(works_table, "assets/catalogue/facets")
+
+
+def rebuild_repo(repo_name: str,
+                 gh_org: Organization,
+                 scheduler: RequestScheduler,
+                 html: bool = False,
+                 mirrors: Optional[GitMirrors] = None,
+                 cache: Optional[FragmentCache] = None) -> None:
+    """Refreshes a single repo in the harvest state and updates its pages.
+
+    Only the pages of the affected composers are generated again. The
+    navigation is only written if the set of composers changed. Ignored
+    and private repos are removed from the harvest state, so that their
+    works are no longer published.
+
+    Args:
+        repo_name (str): name of a score or collection repo
+        gh_org (Organization): GitHub organization
+        scheduler (RequestScheduler): scheduler for GitHub requests
+        html (bool): whether to emit work tables as HTML instead of markdown
+        mirrors (Optional[GitMirrors]): local mirrors of the score repos
+        cache (Optional[FragmentCache]): cache for rendered fragments
+    """
+    if not os.path.exists(HARVEST_CHECKPOINT):
+        raise FileNotFoundError(
+            f"{HARVEST_CHECKPOINT} not found, a full run is required first"
+        )
+    state = HarvestCheckpoint(HARVEST_CHECKPOINT, resume=True)
+    page_settings = load_page_settings("_data/page_settings.yml")
+
+    if repo_name == "cantorey-performance-materials":
+        add_cantorey(gh_org, scheduler, cache)
+        return
+
+    old_works = group_works(state.get_all(), gh_org.login)
+    affected = {c for c, w in old_works.items()
+                if any(m["repo"] == repo_name for m in w)}
+
+    collection_slugs = [
+        slug for slug, settings in page_settings.items()
+        if settings.get("collection_repo") == repo_name
     ]
+    if collection_slugs:
+        for slug in collection_slugs:
+            state.save_collection(
+                slug, get_collection_works(repo_name, gh_org, scheduler)
+            )
+    elif repo_name in IGNORED_REPOS:
+        print(f"Ignoring {repo_name} (blacklisted)")
+        state.remove(repo_name)
+    else:
+        repo = scheduler.call("get_repo", gh_org.get_repo, repo_name)
+        if repo.private:
+            print(f"Ignoring {repo_name} (private)")
+            state.remove(repo_name)
+        else:
+            metadata = harvest_repo(repo, scheduler, state, "(1/1)", mirrors)
+            scheduler.run()
+
+            # without mirrors, the metadata is only saved if all release
+            # dates are available; re-raise the error of a failed request
+            if metadata is not None:
+                for release in metadata["releases"]:
+                    if isinstance(release["date"], Future):
+                        release["date"].result()
+
+    works = group_works(state.get_all(), gh_org.login)
+    collection_works = state.collections
+    works_table = build_works_table(works, collection_works)
+    slices = get_composer_slices(works_table)
+    affected |= {c for c, w in works.items()
+                 if any(m["repo"] == repo_name for m in w)}
+    affected |= {c for c in works
+                 if get_composer_names(c)[1] in collection_slugs}
+
+    for composer in affected:
+        _, slug = get_composer_names(composer)
+        if composer in works:
+            generate_composer_page(composer,
+                                   slices.get(slug, []),
+                                   page_settings,
+                                   html=html,
+                                   cache=cache)
+        elif os.path.exists(f"_pages/scores/{slug}.md"):
+            print("Removing page for", slug)
+            os.remove(f"_pages/scores/{slug}.md")
+
+    if set(works) != set(old_works):
+        print("Updating navigation")
+        write_navigation(works.keys())
+
+    write_catalogue(works_table, "assets/catalogue")
+    write_statistics(works_table, "assets/catalogue/statistics.json")
+    write_facets(works_table, "assets/catalogue/facets")
+
 
-    gh = Github(TOKEN)
-    gh_org = gh.get_organization("edition-esser-skala")
-
-    print(gh.get_rate_limit().resources.core)
-    get_markdown_file(gh_org,
-                      "documents/editorial_guidelines.md",
-                      "editorial-guidelines.md",
-                      "Editorial guidelines")
-    get_markdown_file(gh_org,
-                      "README.md",
-                      "technical-documentation.md",
-                      "Technical documentation",)
-    highlight_lilypond_snippets("_pages/about/technical-documentation.md")
-    all_works = collect_metadata(gh_org, ignored_repos)
-    all_works[Composer("Gregor Joseph", "Werner")] = []
-    all_works[Composer("František Ignác Antonín", "Tůma")] = []
-    generate_score_pages(all_works, gh_org, "_data/page_settings.yml")
-    add_cantorey(gh_org)
-    print(gh.get_rate_limit().resources.core)
+def main() -> None:
+    """Main workflow."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reuse repo metadata from the checkpoint of a previous run"
+    )
+    parser.add_argument(
+        "--html",
+        action="store_true",
+        help="emit work tables as HTML, which kramdown passes through"
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help=f"check all generated asset links and report broken ones "
+             f"in {LINK_REPORT}"
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="only harvest and format shard I of N and write a partial "
+             f"output to {SHARD_DIR}/"
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help=f"combine the partial outputs in {SHARD_DIR}/ into the pages"
+    )
+    parser.add_argument(
+        "--repo",
+        help="only refresh this score or collection repo in the harvest "
+             "state of a previous run and update the affected pages"
+    )
+    parser.add_argument(
+        "--no-mirrors",
+        action="store_true",
+        help=f"read tag dates and files via the API instead of local "
+             f"mirrors in {MIRROR_DIR}/"
+    )
+    args = parser.parse_args()
+    shard = parse_shard(args.shard) if args.shard is not None else None
+    page_settings = load_page_settings("_data/page_settings.yml")
+    generate_header_images()
+    fragments = FragmentCache(FRAGMENT_CACHE if shard is None
+                              else f".cache/fragments-{shard[0]}.json")
+
+    if args.merge:
+        merge_shards(page_settings, fragments)
+        fragments.save()
+        print(fragments.summary())
+        return
+
+    # retries are handled by the scheduler and its resilient caller
+    gh = Github(TOKEN, timeout=REQUEST_TIMEOUT, retry=None)
+    scheduler = RequestScheduler(gh)
+    gh_org = scheduler.call("get_organization",
+                            gh.get_organization,
+                            "edition-esser-skala")
+    mirrors = (None if args.no_mirrors
+               else GitMirrors(gh_org.login, caller=scheduler.resilience))
+
+    print(scheduler.call("get_rate_limit", gh.get_rate_limit).resources.core)
+    if args.repo is not None:
+        rebuild_repo(args.repo,
+                     gh_org,
+                     scheduler,
+                     html=args.html,
+                     mirrors=mirrors,
+                     cache=fragments)
+        fragments.save(prune=False)
+        print(fragments.summary())
+        print(scheduler.summary())
+        print(scheduler.resilience.summary())
+        return
+
+    if shard is None or shard[0] == 1:
+        get_markdown_file(gh_org,
+                          scheduler,
+                          "documents/editorial_guidelines.md",
+                          "editorial-guidelines.md",
+                          "Editorial guidelines")
+        get_markdown_file(gh_org,
+                          scheduler,
+                          "README.md",
+                          "technical-documentation.md",
+                          "Technical documentation",)
+        highlight_lilypond_snippets("_pages/about/technical-documentation.md")
+        urls = add_cantorey(gh_org, scheduler, fragments)
+    else:
+        urls = []
+
+    if shard is None:
+        checkpoint = HarvestCheckpoint(HARVEST_CHECKPOINT, resume=args.resume)
+    else:
+        checkpoint = HarvestCheckpoint(f".cache/harvest-{shard[0]}.json",
+                                       resume=args.resume)
+    all_works = collect_metadata(gh_org,
+                                 scheduler,
+                                 checkpoint,
+                                 IGNORED_REPOS,
+                                 shard=shard,
+                                 mirrors=mirrors)
+    collection_works = collect_collection_works(
+        gh_org,
+        scheduler,
+        {slug: settings for slug, settings in page_settings.items()
+         if in_shard(slug, shard)}
+    )
+    for slug, works in collection_works.items():
+        checkpoint.save_collection(slug, works)
+
+    if shard is None:
+        works_table = build_works_table(all_works, collection_works)
+        generate_score_pages(all_works,
+                             works_table,
+                             page_settings,
+                             html=args.html,
+                             cache=fragments)
+        write_statistics(works_table, "assets/catalogue/statistics.json")
+        write_catalogue(works_table, "assets/catalogue")
+        write_facets(works_table, "assets/catalogue/facets")
+    else:
+        write_shard(all_works,
+                    collection_works,
+                    checkpoint,
+                    shard,
+                    html=args.html)
+
+    if args.check_links:
+        urls += collect_asset_urls(all_works, collection_works)
+        urls += [PREFACE_URL.format(repo=settings["collection_repo"],
+                                    file=settings["preface"])
+                 for slug, settings in page_settings.items()
+                 if "preface" in settings and in_shard(slug, shard)]
+        verify_links(urls)
+
+    fragments.save()
+    print(fragments.summary())
+    print(scheduler.call("get_rate_limit", gh.get_rate_limit).resources.core)
+    print(scheduler.summary())
+    print(scheduler.resilience.summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,391 @@
+"""Deadlines, retries and hedged requests for network operations."""
+
+import argparse
+from concurrent.futures import (FIRST_COMPLETED,
+                                Future,
+                                ThreadPoolExecutor,
+                                wait)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import statistics
+import threading
+import time
+from typing import Any, Callable, Optional
+import urllib.error
+import urllib.request
+
+from git import GitCommandError
+from github.GithubException import GithubException
+import requests
+
+# socket timeout of a single GitHub request (in seconds)
+REQUEST_TIMEOUT = 20
+
+# parts of git error messages that indicate a network failure
+GIT_NETWORK_ERRORS = ["could not resolve host",
+                      "failed to connect",
+                      "connection refused",
+                      "connection reset",
+                      "connection timed out",
+                      "operation timed out",
+                      "the remote end hung up unexpectedly",
+                      "early eof",
+                      "rpc failed",
+                      "unable to access"]
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised if a call does not finish before its deadline."""
+
+
+def is_transient(e: BaseException) -> bool:
+    """Checks whether a failed call may succeed if it is repeated.
+
+    Rate limits are not transient errors, since they are handled by
+    the scheduler. All other errors (e.g., missing files or failed git
+    commands) fail immediately.
+
+    Args:
+        e (BaseException): the exception raised by the call
+
+    Returns:
+        bool: True for timeouts, connection errors, server errors and
+          git commands that failed due to the network
+    """
+    if isinstance(e, GithubException):
+        return e.status is not None and e.status >= 500
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code >= 500
+    if isinstance(e, urllib.error.URLError):
+        return isinstance(e.reason, (TimeoutError, ConnectionError))
+    if isinstance(e, GitCommandError):
+        stderr = str(e.stderr).lower()
+        return any(error in stderr for error in GIT_NETWORK_ERRORS)
+    return isinstance(e, (TimeoutError,
+                          ConnectionError,
+                          requests.ConnectionError,
+                          requests.Timeout))
+
+
+class LatencyStats:
+    """Records call latencies per operation."""
+
+    def __init__(self) -> None:
+        """Initializes the statistics."""
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+
+    def record(self, name: str, latency: float) -> None:
+        """Records the latency of a successful call.
+
+        Args:
+            name (str): name of the operation
+            latency (float): latency (in seconds)
+        """
+        with self._lock:
+            self.latencies.setdefault(name, []).append(latency)
+
+    def percentile(self, name: str, p: int, min_samples: int = 1) -> float:
+        """Returns a latency percentile of an operation.
+
+        Args:
+            name (str): name of the operation
+            p (int): percentile (1–99)
+            min_samples (int): minimum number of recorded latencies
+
+        Returns:
+            float: latency (in seconds), or infinity if there are too few
+              recorded latencies
+        """
+        with self._lock:
+            latencies = list(self.latencies.get(name, []))
+        if len(latencies) < max(min_samples, 2):
+            return float("inf")
+        return statistics.quantiles(latencies, n=100)[p - 1]
+
+    def summary(self) -> str:
+        """Returns p50/p95/p99 latencies of all operations.
+
+        Operations with a single call show its latency for each
+        percentile.
+        """
+        lines = []
+        for name in sorted(self.latencies):
+            n_calls = len(self.latencies[name])
+            if n_calls == 0:
+                p50 = p95 = p99 = "n/a"
+            elif n_calls == 1:
+                p50 = p95 = p99 = f"{self.latencies[name][0]:.3f} s"
+            else:
+                p50, p95, p99 = (f"{self.percentile(name, p):.3f} s"
+                                 for p in (50, 95, 99))
+            lines.append(f"  -> {name}: {n_calls} calls, "
+                         f"p50 {p50}, p95 {p95}, p99 {p99}")
+        return "\n".join(lines)
+
+
+class ResilientCaller:
+    """Runs network calls with deadlines, retries and optional hedging.
+
+    Each attempt runs in a worker thread and is abandoned once its
+    deadline has passed (timeouts of the underlying sockets and
+    processes ensure that the thread finishes eventually). Transient
+    errors are retried with exponential backoff and full jitter.
+
+    Hedging is opt-in per call: a hedged call issues a duplicate request
+    if the first one takes longer than a latency percentile of previous
+    calls of the same named operation, and uses whichever finishes
+    first. Only pass hedged=True for idempotent reads that issue a single
+    request. No duplicate is issued while all workers are busy, so that
+    hedges never wait behind abandoned attempts.
+    """
+
+    def __init__(self,
+                 deadline: float = 60,
+                 max_retries: int = 3,
+                 backoff_base: float = 1,
+                 backoff_cap: float = 30,
+                 hedge_percentile: int = 95,
+                 min_samples: int = 20,
+                 max_workers: int = 32) -> None:
+        """Initializes the caller.
+
+        Args:
+            deadline (float): deadline of a single attempt (in seconds)
+            max_retries (int): retries after transient errors
+            backoff_base (float): backoff before the first retry
+              (in seconds)
+            backoff_cap (float): maximum backoff (in seconds)
+            hedge_percentile (int): latency percentile after which a
+              hedged request is issued
+            min_samples (int): calls of an operation that are recorded
+              before requests are hedged
+            max_workers (int): maximum number of concurrent attempts
+        """
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+
+        self.max_workers = max_workers
+
+        self.stats = LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.n_retries = 0
+        self.n_hedged = 0
+        self.n_deadlines = 0
+
+    def _backoff(self, attempt: int) -> float:
+        """Returns the jittered backoff before a retry."""
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        )
+
+    def _submit(self,
+                fn: Callable,
+                args: tuple,
+                kwargs: dict,
+                on_request: Optional[Callable[[], None]]) -> Future:
+        """Runs fn in a worker thread and tracks the running requests."""
+        def on_done(_: Future) -> None:
+            with self._lock:
+                self._in_flight -= 1
+
+        with self._lock:
+            self._in_flight += 1
+        if on_request is not None:
+            on_request()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(on_done)
+        return future
+
+    def _attempt(self,
+                 name: str,
+                 hedged: bool,
+                 deadline: float,
+                 fn: Callable,
+                 args: tuple,
+                 kwargs: dict,
+                 on_request: Optional[Callable[[], None]]) -> Any:
+        """Runs a single attempt of a call.
+
+        Raises:
+            DeadlineExceeded: if no request finished before the deadline
+
+        Returns:
+            Any: return value of fn
+        """
+        start = time.perf_counter()
+        pending = {self._submit(fn, args, kwargs, on_request)}
+
+        if hedged:
+            hedge_after = self.stats.percentile(name,
+                                                self.hedge_percentile,
+                                                self.min_samples)
+            done, _ = wait(pending, timeout=min(hedge_after, deadline))
+            with self._lock:
+                has_worker = self._in_flight < self.max_workers
+            if not done and hedge_after < deadline and has_worker:
+                with self._lock:
+                    self.n_hedged += 1
+                pending.add(self._submit(fn, args, kwargs, on_request))
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - (time.perf_counter() - start)
+            done, pending = wait(pending,
+                                 timeout=max(0.0, remaining),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.stats.record(name, time.perf_counter() - start)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        with self._lock:
+            self.n_deadlines += 1
+        raise DeadlineExceeded(
+            f"{name} did not finish within {deadline:.0f} s"
+        )
+
+    def call(self,
+             name: str,
+             fn: Callable,
+             *args,
+             hedged: bool = False,
+             deadline: Optional[float] = None,
+             on_request: Optional[Callable[[], None]] = None,
+             **kwargs) -> Any:
+        """Runs a call with deadline and retries.
+
+        Args:
+            name (str): name of the operation, under which latencies are
+              recorded (calls with the same name should issue the same
+              kind of request)
+            fn (Callable): function that issues the request(s)
+            *args: positional arguments of fn
+            hedged (bool): whether slow calls are hedged (only for
+              idempotent reads that issue a single request)
+            deadline (Optional[float]): deadline of a single attempt
+              (default: deadline of the caller)
+            on_request (Optional[Callable[[], None]]): called whenever fn
+              is started (including retries and hedged requests)
+            **kwargs: keyword arguments of fn
+
+        Raises:
+            Exception: the last error if it is not transient or if all
+              retries are exhausted
+
+        Returns:
+            Any: return value of fn
+        """
+        if deadline is None:
+            deadline = self.deadline
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._attempt(name, hedged, deadline,
+                                     fn, args, kwargs, on_request)
+            except Exception as e:  # pylint: disable=broad-except
+                if not is_transient(e) or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"{name} failed ({type(e).__name__}), "
+                      f"retrying in {delay:.1f} s")
+                with self._lock:
+                    self.n_retries += 1
+                time.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def summary(self) -> str:
+        """Returns statistics on retries, hedged requests and latencies."""
+        return (f"{self.n_retries} retries, "
+                f"{self.n_hedged} hedged requests, "
+                f"{self.n_deadlines} missed deadlines\n"
+                + self.stats.summary())
+
+
+class FaultInjectingHandler(BaseHTTPRequestHandler):
+    """Stub server that answers with random delays and errors."""
+
+    # probability and behaviour of each kind of response
+    FAULTS = [(0.94, "ok", 0.02),
+              (0.04, "slow", 1.5),
+              (0.01, "hang", 10.0),
+              (0.01, "error", 0.02)]
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Answers a request."""
+        r = random.random()
+        for probability, kind, delay in self.FAULTS:
+            if r < probability:
+                break
+            r -= probability
+        time.sleep(random.uniform(0.5, 1.5) * delay)
+
+        status = 503 if kind == "error" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        """Suppresses request logs."""
+
+
+def demo(n_requests: int) -> None:
+    """Compares plain and resilient calls to a fault-injecting stub server.
+
+    Args:
+        n_requests (int): number of requests per variant
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultInjectingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    def get() -> bytes:
+        with urllib.request.urlopen(url, timeout=REQUEST_TIMEOUT) as r:
+            return r.read()
+
+    random.seed(0)
+    plain = LatencyStats()
+    n_errors = 0
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        try:
+            get()
+        except urllib.error.HTTPError:
+            n_errors += 1
+        plain.record("plain", time.perf_counter() - start)
+    print(f"Plain calls ({n_errors} failed):")
+    print(plain.summary())
+
+    random.seed(0)
+    caller = ResilientCaller(deadline=2, backoff_base=0.1)
+    resilient = LatencyStats()
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        caller.call("get", get, hedged=True)
+        resilient.record("resilient", time.perf_counter() - start)
+    print(f"Resilient calls ({caller.summary().splitlines()[0]}):")
+    print(resilient.summary())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--demo",
+                        type=int,
+                        default=500,
+                        metavar="N",
+                        help="number of requests to the stub server")
+    demo(parser.parse_args().demo)
@@ -0,0 +1,300 @@
+"""Rate-limit-aware scheduling of GitHub API requests."""
+
+from concurrent.futures import (FIRST_COMPLETED,
+                                Future,
+                                ThreadPoolExecutor,
+                                wait)
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from github import Github
+from github.GithubException import GithubException, RateLimitExceededException
+
+from resilience import ResilientCaller
+
+# requests that the generated pages depend on
+# (release lists, metadata files, assets, latest tag dates)
+PRIORITY_HIGH = 0
+
+# requests for historical data (tag dates of older releases)
+PRIORITY_LOW = 1
+
+
+class RequestScheduler:
+    """Runs GitHub requests paced to the remaining rate limit budget.
+
+    Every request is issued via `call()` (synchronously) or `submit()`
+    (queued by priority and executed by `run()`). After each request, the
+    budget is read from the rate limit headers of the last response.
+    While the budget is plentiful, queued requests run concurrently;
+    once it falls below the low-water mark, requests are serialized and
+    spread evenly until the reset time. Secondary rate limits (403/429)
+    pause all requests for the time requested by GitHub.
+    """
+
+    def __init__(self,
+                 gh: Github,
+                 max_workers: int = 4,
+                 low_water: float = 0.2,
+                 reserve: int = 50,
+                 max_retries: int = 5,
+                 resilience: Optional[ResilientCaller] = None) -> None:
+        """Initializes the scheduler.
+
+        Args:
+            gh (Github): GitHub client whose requests are scheduled
+            max_workers (int): maximum number of concurrent requests
+            low_water (float): fraction of the limit below which requests
+              are serialized and paced
+            reserve (int): requests that are never used by the scheduler
+            max_retries (int): retries after hitting a rate limit
+            resilience (Optional[ResilientCaller]): caller that runs each
+              request with deadline, retries and optional hedging
+              (default: new caller)
+        """
+        self.gh = gh
+        self.max_workers = max_workers
+        self.low_water = low_water
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.resilience = (resilience if resilience is not None
+                           else ResilientCaller())
+
+        self._lock = threading.Lock()
+        self._queue: list = []
+        self._counter = itertools.count()
+        self._paused_until = 0.0
+        self._next_slot = 0.0
+        self._remaining = -1
+        self._limit = -1
+        self._reset = 0.0
+
+        self.n_requests = 0
+        self.n_backoffs = 0
+        self.time_waited = 0.0
+
+    def _update_budget(self) -> None:
+        """Reads the budget from the headers of the last response.
+
+        The values cached by the requester are read directly, since the
+        properties of the client request the rate limit themselves if no
+        headers have been seen yet. The budget is left unchanged while
+        the values are unknown.
+        """
+        requester = getattr(self.gh, "_Github__requester")
+        remaining, limit = requester.rate_limiting
+        reset = requester.rate_limiting_resettime
+        if limit < 0 or reset == 0:
+            return
+        with self._lock:
+            self._remaining = remaining
+            self._limit = limit
+            self._reset = float(reset)
+
+    def _concurrency(self) -> int:
+        """Returns the number of requests that may run concurrently."""
+        with self._lock:
+            if self._remaining < 0 or self._limit <= 0:
+                return 1
+            if self._remaining > self.low_water * self._limit:
+                return self.max_workers
+            return 1
+
+    def _delay(self) -> float:
+        """Reserves the start time of the next request.
+
+        All requests share one "next allowed time", so that requests of
+        concurrent tasks are spread evenly as well once the budget is low.
+
+        Returns:
+            float: time to wait before the request
+        """
+        with self._lock:
+            now = time.time()
+            start = max(now, self._paused_until, self._next_slot)
+            interval = 0.0
+            if self._remaining >= 0 and self._limit > 0:
+                to_reset = max(0.0, self._reset - now)
+                usable = self._remaining - self.reserve
+                if usable <= 0:
+                    start = max(start, self._reset + 1)
+                elif self._remaining <= self.low_water * self._limit:
+                    interval = to_reset / usable
+            self._next_slot = start + interval
+            return start - now
+
+    @staticmethod
+    def _is_rate_limited(e: GithubException) -> bool:
+        """Checks whether a failed request hit a primary or secondary limit.
+
+        Args:
+            e (GithubException): the exception raised by PyGithub
+
+        Returns:
+            bool: True if the request should be retried later
+        """
+        if isinstance(e, RateLimitExceededException) or e.status == 429:
+            return True
+        if e.status != 403:
+            return False
+        headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+        return ("retry-after" in headers
+                or headers.get("x-ratelimit-remaining") == "0"
+                or "rate limit" in str(e.data).lower())
+
+    def _backoff(self, e: GithubException, attempt: int) -> None:
+        """Pauses all requests after hitting a rate limit.
+
+        Args:
+            e (GithubException): the exception raised by PyGithub
+            attempt (int): number of the failed attempt (starting at 0)
+        """
+        headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+        if "retry-after" in headers:
+            wait_time = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-remaining") == "0":
+            wait_time = float(headers["x-ratelimit-reset"]) - time.time() + 1
+        else:
+            wait_time = 60.0 * 2 ** attempt
+
+        print(f"Rate limit hit (HTTP {e.status}), "
+              f"pausing for {wait_time:.0f} s")
+        with self._lock:
+            self.n_backoffs += 1
+            self._paused_until = max(self._paused_until,
+                                     time.time() + wait_time)
+
+    def _count_request(self) -> None:
+        """Counts a request (including retries and hedged requests)."""
+        with self._lock:
+            self.n_requests += 1
+
+    def call(self,
+             name: str,
+             fn: Callable,
+             *args,
+             hedged: bool = False,
+             **kwargs) -> Any:
+        """Issues a request once the budget permits.
+
+        The request runs with a deadline and is retried after transient
+        errors (see `ResilientCaller`). Hedged requests are only issued
+        while the budget is plentiful.
+
+        Args:
+            name (str): name of the operation
+            fn (Callable): function that issues the request(s)
+            *args: positional arguments of fn
+            hedged (bool): whether slow calls are hedged (only for
+              idempotent reads that issue a single request)
+            **kwargs: keyword arguments of fn
+
+        Raises:
+            GithubException: if the request fails for other reasons than
+              rate limits or if all retries are exhausted
+
+        Returns:
+            Any: return value of fn
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self._delay()
+            if delay > 0:
+                with self._lock:
+                    self.time_waited += delay
+                time.sleep(delay)
+
+            try:
+                return self.resilience.call(
+                    name,
+                    fn,
+                    *args,
+                    hedged=hedged and self._concurrency() > 1,
+                    on_request=self._count_request,
+                    **kwargs
+                )
+            except GithubException as e:
+                if (not self._is_rate_limited(e)
+                        or attempt == self.max_retries):
+                    raise
+                self._backoff(e, attempt)
+            finally:
+                # never mask the exception of the request
+                try:
+                    self._update_budget()
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f"Could not read the rate limit ({e})")
+
+        raise AssertionError("unreachable")
+
+    def submit(self,
+               name: str,
+               fn: Callable,
+               *args,
+               priority: int = PRIORITY_HIGH,
+               paced: bool = True,
+               hedged: bool = False,
+               **kwargs) -> Future:
+        """Queues a request that is executed by `run()`.
+
+        Args:
+            name (str): name of the operation
+            fn (Callable): function that issues the request(s)
+            *args: positional arguments of fn
+            priority (int): requests with lower values are executed first
+            paced (bool): whether fn is issued via `call()`; pass False if
+              fn already issues each of its requests via `call()`
+            hedged (bool): whether slow calls are hedged (only for paced,
+              idempotent reads that issue a single request)
+            **kwargs: keyword arguments of fn
+
+        Returns:
+            Future: result of the request
+        """
+        future: Future = Future()
+        with self._lock:
+            heapq.heappush(self._queue,
+                           (priority, next(self._counter),
+                            name, fn, args, kwargs, paced, hedged, future))
+        return future
+
+    def _run_task(self, task: tuple) -> None:
+        """Executes a queued request and stores its result."""
+        _, _, name, fn, args, kwargs, paced, hedged, future = task
+        try:
+            if paced:
+                future.set_result(
+                    self.call(name, fn, *args, hedged=hedged, **kwargs)
+                )
+            else:
+                future.set_result(fn(*args, **kwargs))
+        except Exception as e:  # pylint: disable=broad-except
+            future.set_exception(e)
+
+    def run(self) -> None:
+        """Executes all queued requests, including those queued meanwhile."""
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            running: set = set()
+            while True:
+                with self._lock:
+                    n_queued = len(self._queue)
+                if n_queued == 0 and not running:
+                    break
+
+                while len(running) < self._concurrency():
+                    with self._lock:
+                        if not self._queue:
+                            break
+                        task = heapq.heappop(self._queue)
+                    running.add(executor.submit(self._run_task, task))
+
+                _, running = wait(running, return_when=FIRST_COMPLETED)
+
+    def summary(self) -> str:
+        """Returns statistics on the scheduled requests."""
+        return (f"{self.n_requests} scheduled requests, "
+                f"{self.n_backoffs} rate limit backoffs, "
+                f"{self.time_waited:.0f} s waited, "
+                f"{self._remaining}/{self._limit} remaining")
@@ -0,0 +1,306 @@
+"""Columnar table of all works for sorting, grouping and statistics."""
+
+import argparse
+import json
+import os
+import random
+import time
+from operator import attrgetter, itemgetter
+
+import pandas as pd
+
+from common_functions import (SLUG_REPLACE,
+                              Composer,
+                              get_composer_names,
+                              get_details_sort_key,
+                              slugify)
+
+COMPOSER_COLUMNS = ["composer_first", "composer_last", "composer_suffix"]
+
+SLUG_TABLE = str.maketrans(SLUG_REPLACE)
+
+TABLE_COLUMNS = ["id", "title", "genre", "license_id", "repo"]
+
+
+def slugify_column(s: pd.Series) -> pd.Series:
+    """Formats a column of strings as valid slugs (vectorized `slugify`).
+
+    Args:
+        s (pd.Series): strings to format
+
+    Returns:
+        pd.Series: slugs
+    """
+    return s.astype(str).str.lower().str.translate(SLUG_TABLE)
+
+
+def add_composer_columns(table: pd.DataFrame) -> pd.DataFrame:
+    """Adds page title and slug of the composer of each work.
+
+    This is a vectorized version of `get_composer_names`.
+
+    Args:
+        table (pd.DataFrame): works table with composer name columns
+
+    Returns:
+        pd.DataFrame: works table with composer title and slug
+    """
+    first, last, suffix = (table[c] for c in COMPOSER_COLUMNS)
+    anonymous = last == "Anonymus"
+    has_suffix = suffix != ""
+
+    title = last + ", " + first
+    title = title.where(~has_suffix, last + " " + suffix + ", " + first)
+    title = title.where(~anonymous, last)
+
+    slug = first + "-" + last
+    slug = slug.where(~has_suffix, slug + "-" + suffix)
+    slug = slug.where(~anonymous, last)
+
+    return table.assign(composer_title=title,
+                        composer_slug=slugify_column(slug))
+
+
+def make_table(records: list[dict], composers: list[Composer]) -> pd.DataFrame:
+    """Creates a table with one row per work.
+
+    Args:
+        records (list[dict]): work metadata
+        composers (list[Composer]): composer of each work
+
+    Returns:
+        pd.DataFrame: table with the columns used for sorting, grouping and
+          statistics, and the metadata dict of each work
+    """
+    table = pd.DataFrame.from_records(
+        [[r[c] for c in TABLE_COLUMNS] for r in records],
+        columns=TABLE_COLUMNS
+    )
+    table[COMPOSER_COLUMNS] = pd.DataFrame.from_records(
+        [tuple(c) for c in composers],
+        columns=COMPOSER_COLUMNS
+    )
+    table["record"] = pd.Series(records, dtype=object)
+    return table
+
+
+def build_works_table(works: dict, collection_works: dict) -> pd.DataFrame:
+    """Merges works from individual and collection repos into one table.
+
+    Collection works are assigned to the composer whose page lists the
+    collection; collections of composers without works from individual
+    repos are skipped (they have no page). If a work is available both in
+    an individual repo and in a collection repo, only the former is kept.
+    The table is sorted by composer and by the order of the work details
+    on the composer page, so that slices need not be sorted again.
+
+    Args:
+        works (dict): works metadata
+        collection_works (dict): works metadata from collection repos
+
+    Returns:
+        pd.DataFrame: one row per work
+    """
+    page_composers = {get_composer_names(c)[1]: c for c in works}
+
+    repo_works = make_table(
+        [w for composer_works in works.values() for w in composer_works],
+        [c for c, composer_works in works.items() for _ in composer_works]
+    )
+    repo_works["collection"] = False
+
+    collection_works = {slug: slug_works
+                        for slug, slug_works in collection_works.items()
+                        if slug in page_composers}
+    coll_works = make_table(
+        [w for slug_works in collection_works.values() for w in slug_works],
+        [page_composers[slug]
+         for slug, slug_works in collection_works.items()
+         for _ in slug_works]
+    )
+    coll_works["collection"] = True
+
+    table = add_composer_columns(
+        pd.concat([repo_works, coll_works], ignore_index=True)
+    )
+    table["id_slug"] = slugify_column(table["id"])
+    table["details_key"] = table["record"].map(get_details_sort_key)
+
+    return (table
+            .drop_duplicates(subset=["composer_slug", "id_slug", "title"],
+                             keep="first")
+            .sort_values(["composer_last",
+                          "composer_suffix",
+                          "composer_first",
+                          "details_key"],
+                         kind="stable")
+            .reset_index(drop=True))
+
+
+def get_composer_slices(table: pd.DataFrame) -> dict[str, list[dict]]:
+    """Groups the works table by composer.
+
+    Args:
+        table (pd.DataFrame): works table
+
+    Returns:
+        dict[str, list[dict]]: work metadata for each composer slug (in
+          the order of the work details)
+    """
+    records = table["record"].tolist()
+    indices = table.groupby("composer_slug", sort=False).indices
+    return {slug: [records[i] for i in indices[slug]]
+            for slug in table["composer_slug"].unique()}
+
+
+def get_statistics(table: pd.DataFrame) -> dict[str, dict[str, int]]:
+    """Counts works per genre, license and composer.
+
+    Args:
+        table (pd.DataFrame): works table
+
+    Returns:
+        dict[str, dict[str, int]]: counts for each statistic
+    """
+    return {
+        "genre": table["genre"].value_counts().to_dict(),
+        "license": table["license_id"].value_counts().to_dict(),
+        "composer": table["composer_title"].value_counts().to_dict(),
+        "total": {"works": len(table),
+                  "composers": table["composer_slug"].nunique()}
+    }
+
+
+def write_statistics(table: pd.DataFrame, file: str) -> None:
+    """Prints build-time statistics and saves them as JSON.
+
+    Args:
+        table (pd.DataFrame): works table
+        file (str): output file
+    """
+    stats = get_statistics(table)
+    print(f"Statistics: {stats['total']['works']} works "
+          f"by {stats['total']['composers']} composers")
+    for key in ["genre", "license"]:
+        counts = ", ".join(f"{k} ({v})" for k, v in stats[key].items())
+        print(f"  -> {key}: {counts}")
+
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump({k: {str(i): int(n) for i, n in v.items()}
+                   for k, v in stats.items()},
+                  f,
+                  ensure_ascii=False,
+                  sort_keys=True)
+
+
+def make_synthetic_works(n_composers: int,
+                         n_works: int,
+                         n_coll_works: int) -> tuple[dict, dict]:
+    """Creates random work metadata for benchmarks.
+
+    Args:
+        n_composers (int): number of composers
+        n_works (int): number of works from individual repos
+        n_coll_works (int): number of works from four collection repos
+
+    Returns:
+        tuple[dict, dict]: works and collection works metadata
+    """
+    rng = random.Random(0)
+    composers = [Composer(f"Johann {i}",
+                          f"Müller{i:04d}",
+                          rng.choice(["", "Jr."]))
+                 for i in range(n_composers)]
+
+    def make_work(i: int, composer: Composer) -> dict:
+        work_id = f"Op. {i}"
+        return {
+            "composer": composer._asdict(),
+            "id": work_id,
+            "id_slug": slugify(work_id),
+            "title": f"Missa {rng.randrange(10**6)}",
+            "subtitle": work_id,
+            "genre": rng.choice(["Mass", "Litany", "Vespers", "Offertory"]),
+            "license_id": rng.choice(["cc-by-sa-4.0", "cc-by-nc-sa-4.0"]),
+            "repo": f"repo-{i}",
+            "releases": [{"version": "v1.0.0", "date": "2024-01-01"}]
+        }
+
+    works: dict = {c: [] for c in composers}
+    for i in range(n_works):
+        composer = rng.choice(composers)
+        works[composer].append(make_work(i, composer))
+
+    n_coll = n_coll_works // 4
+    collection_works = {
+        get_composer_names(c)[1]: [make_work(n_works + n_coll * j + i, c)
+                                   for i in range(n_coll)]
+        for j, c in enumerate(composers[:4])
+    }
+    return works, collection_works
+
+
+def process_dicts(works: dict, collection_works: dict) -> dict:
+    """Reference implementation with per-dict loops (for benchmarks)."""
+    res = {}
+    for composer in sorted(works.keys(),
+                           key=attrgetter("last", "suffix", "first")):
+        _, slug = get_composer_names(composer)
+        composer_works = (sorted(works[composer], key=itemgetter("title"))
+                          + collection_works.get(slug, []))
+        seen = set()
+        deduplicated = []
+        for w in composer_works:
+            w = dict(w, id_slug=slugify(w["id"]))
+            key = (w["id_slug"], w["title"])
+            if key not in seen:
+                seen.add(key)
+                deduplicated.append(w)
+        res[slug] = sorted(deduplicated, key=itemgetter("title"))
+
+    stats: dict[str, dict] = {"genre": {}, "license": {}, "composer": {}}
+    for composer, composer_works in res.items():
+        for w in composer_works:
+            for stat, value in [("genre", w["genre"]),
+                                ("license", w["license_id"]),
+                                ("composer", composer)]:
+                stats[stat][value] = stats[stat].get(value, 0) + 1
+    return res
+
+
+def process_table(works: dict, collection_works: dict) -> dict:
+    """Implementation with the columnar works table (for benchmarks)."""
+    table = build_works_table(works, collection_works)
+    get_statistics(table)
+    return get_composer_slices(table)
+
+
+def benchmark(scale: int) -> None:
+    """Compares dict loops and the works table on synthetic metadata.
+
+    Args:
+        scale (int): size relative to the current organization
+          (about 50 composers, 250 score repos and 1000 collection works)
+    """
+    works, collection_works = make_synthetic_works(50 * scale,
+                                                   250 * scale,
+                                                   1000 * scale)
+    n_works = (sum(len(w) for w in works.values())
+               + sum(len(w) for w in collection_works.values()))
+    print(f"Benchmark with {len(works)} composers and {n_works} works")
+
+    for name, fn in [("dicts", process_dicts), ("table", process_table)]:
+        start = time.perf_counter()
+        fn(works, collection_works)
+        print(f"  -> {name}: {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--benchmark",
+                        type=int,
+                        default=10,
+                        metavar="SCALE",
+                        help="size relative to the current organization")
+    benchmark(parser.parse_args().benchmark)
@@ -0,0 +1,6 @@
+$(document).ready(function() {
+  var path = window.location.pathname.replace(/\/?$/, "/");
+  $(".nav__list--prerendered a").filter(function() {
+    return $(this).attr("href").replace(/\/?$/, "/") === path;
+  }).addClass("active");
+} );